@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""Headless benchmarks of bfm hot paths.
+
+Synthetic trees are built in a temporary directory, and widgets are driven
+without a terminal: keys are sent with `keypress`, and screens are rendered to
+canvases. Startup is measured in fresh interpreters, up to the first frame and
+up to the first frame showing the listing. Results are written as JSON, and
+can be compared against a baseline:
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline results.json
+
+The exit status is 1 when a benchmark is slower than its baseline by more than
+the given threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import urwid  # noqa: E402
+
+import bfm  # noqa: E402
+from bfm import config  # noqa: E402
+from bfm.keys import unhandled_input  # noqa: E402
+from bfm.palette import palette  # noqa: E402
+from bfm.vendor.ansi_widget import ANSIWidget  # noqa: E402
+from bfm.widgets import RootWidget  # noqa: E402
+from bfm.widgets.fs import FolderWidget  # noqa: E402
+
+SIZE = (120, 50)
+
+
+# Trees
+
+
+def touch(path: str):
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def build_flat(root: str, count: int):
+    os.mkdir(root)
+    for i in range(count):
+        touch(os.path.join(root, "file{:07d}.txt".format(i)))
+
+
+def build_deep(root: str, depth: int = 200, width: int = 10):
+    path = root
+    for i in range(depth):
+        os.makedirs(path)
+        for j in range(width):
+            touch(os.path.join(path, "file{}".format(j)))
+        path = os.path.join(path, "level{}".format(i))
+
+
+def build_symlinks(root: str, count: int):
+    os.makedirs(os.path.join(root, "targets"))
+    for i in range(count):
+        name = "target{}".format(i)
+        target = os.path.join("targets", name)
+        if i % 3 == 0:
+            os.mkdir(os.path.join(root, target))
+        elif i % 3 == 1:
+            touch(os.path.join(root, target))
+        # else: broken symlink
+        os.symlink(target, os.path.join(root, "link{}".format(i)))
+
+
+def build_mixed(root: str, count: int):
+    os.mkdir(root)
+    for i in range(count):
+        path = os.path.join(root, "item{}".format(i))
+        kind = i % 5
+        if kind == 0:
+            os.mkdir(path)
+        elif kind == 1:
+            touch(path)
+            os.chmod(path, 0o755)
+        elif kind == 2:
+            os.symlink("item0", path)
+        elif kind == 3 and hasattr(os, "mkfifo"):
+            os.mkfifo(path)
+        else:
+            with open(path, "w") as f:
+                f.write("x" * i)
+
+
+def ansi_text(lines: int) -> bytes:
+    line = (
+        "\x1b[32mdef\x1b[0m \x1b[1;34mfunction\x1b[0m(arg1, arg2):  # comment"
+    )
+    return "\n".join("{:5} {}".format(i, line) for i in range(lines)).encode()
+
+
+# Measurements
+
+
+def measure(func, setup=lambda: None, repeat: int = 5) -> dict:
+    # `setup` is not timed, its result is given to `func`
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "repeat": repeat,
+    }
+
+
+def create_loop():
+    # A main loop whose screen is never started: nothing is drawn, but alarms
+    # and watched files work as usual.
+    loop = urwid.MainLoop(
+        None,
+        palette,
+        unhandled_input=unhandled_input,
+        handle_mouse=False,
+        pop_ups=True,
+        screen=urwid.display.raw.Screen(),
+    )
+    bfm.loop = loop
+    return loop
+
+
+def run_pending(loop, timeout: float = 0.05):
+    # Run the event loop until nothing happened during `timeout` seconds
+    def stop(*args):
+        raise urwid.ExitMainLoop
+
+    loop.set_alarm_in(timeout, stop)
+    try:
+        loop.event_loop.run()
+    except urwid.ExitMainLoop:
+        pass
+
+
+def folder_benchmarks(name: str, path: str, repeat: int):
+    results = {}
+
+    def enter(_):
+        FolderWidget._snapshots.clear()
+        w_folder = FolderWidget(background=False)
+        w_folder.change_path(path)
+        return w_folder
+
+    results["enter"] = measure(enter, repeat=repeat)
+
+    w_folder = enter(None)
+    last = w_folder.body.entries[-1].path
+
+    results["enter_cached"] = measure(
+        lambda _: FolderWidget(background=False).change_path(path),
+        repeat=repeat,
+    )
+    results["refresh"] = measure(lambda _: w_folder.refresh(), repeat=repeat)
+    results["focus_item_by_path"] = measure(
+        lambda _: w_folder.focus_item_by_path(last),
+        setup=lambda: w_folder.focus_position(0),
+        repeat=repeat,
+    )
+    results["render"] = measure(
+        lambda _: w_folder.render(SIZE, focus=True),
+        setup=lambda: w_folder.body.clear_widgets(),
+        repeat=repeat,
+    )
+
+    def navigate(_):
+        # Key repeat: one render per key. NB: like a real screen, the last
+        # canvas is kept, otherwise the canvases of the items could not be
+        # reused.
+        canvas = w_folder.render(SIZE, focus=True)
+        for _ in range(200):
+            w_folder.move_focus(1)
+            canvas = w_folder.render(SIZE, focus=True)
+        return canvas
+
+    results["navigate_200"] = measure(
+        navigate, setup=lambda: w_folder.focus_position(0), repeat=repeat
+    )
+    results["filter"] = measure(
+        lambda _: [w_folder.set_filter(text) for text in ["1", "12", "123"]],
+        setup=lambda: w_folder.set_filter(""),
+        repeat=repeat,
+    )
+    w_folder.set_filter("")
+    # NB: the keys are computed during the first run only
+    results["sort_mtime"] = measure(
+        lambda _: w_folder.set_sort_order("mtime"),
+        setup=lambda: w_folder.set_sort_order("name"),
+        repeat=repeat,
+    )
+    w_folder.set_sort_order("name")
+    return {"{}.{}".format(name, k): v for k, v in results.items()}
+
+
+def root_benchmarks(name: str, path: str, repeat: int):
+    loop = create_loop()
+    w_root = bfm.w_root = loop.widget = RootWidget(path)
+    run_pending(loop)
+    # The last canvas, kept like a real screen does
+    canvases = [w_root.render(SIZE, focus=True)]
+
+    def keys(_):
+        # A burst of keys, handled in a single iteration of the main loop,
+        # then rendered once.
+        for key in ["j"] * 100:
+            key = w_root.keypress(SIZE, key)
+            if key:
+                unhandled_input(key)
+        run_pending(loop, 0)
+        canvases[0] = w_root.render(SIZE, focus=True)
+
+    def setup():
+        w_root.keypress(SIZE, "g")
+        unhandled_input("g")
+        w_root.keypress(SIZE, "g")
+        run_pending(loop, 0)
+
+    return {"{}.root_keys_100".format(name): measure(keys, setup, repeat)}
+
+
+def preview_benchmarks(repeat: int):
+    text = ansi_text(config.preview_max_lines)
+    results = {}
+
+    def render(w):
+        # NB: lines are only rendered when the content of the canvas is read
+        list(w.render(SIZE).content(cols=SIZE[0], rows=SIZE[1]))
+
+    def setup():
+        return ANSIWidget(text)
+
+    results["preview.render_cold"] = measure(render, setup, repeat)
+    w = setup()
+    render(w)
+    results["preview.render_cached"] = measure(
+        render, lambda: w._invalidate() or w, repeat
+    )
+
+    def stream(w):
+        chunk_size = 4096
+        for start in range(0, len(text), chunk_size):
+            end = start + chunk_size
+            w.append(text[start:end])
+            render(w)
+
+    results["preview.stream"] = measure(stream, ANSIWidget, repeat)
+    return results
+
+
+# Run in a fresh interpreter: prints a line each time a milestone is reached,
+# the parent process timestamps them.
+STARTUP_SCRIPT = """
+import sys
+
+import bfm
+print("import", flush=True)
+
+import urwid
+from bfm.keys import unhandled_input
+from bfm.main_loop import MainLoop
+from bfm.palette import palette
+from bfm.widgets import RootWidget
+print("import_widgets", flush=True)
+
+bfm.loop = loop = MainLoop(
+    None,
+    palette,
+    unhandled_input=unhandled_input,
+    handle_mouse=False,
+    pop_ups=True,
+    screen=urwid.display.raw.Screen(),
+)
+loop.widget = bfm.w_root = RootWidget(sys.argv[1])
+frames = []
+
+def on_idle():
+    # Same as drawing the screen, which is not started
+    frames.append(loop.widget.render((120, 50), focus=True))
+    if len(frames) == 1:
+        print("first_frame", flush=True)
+    if len(bfm.w_root._w_folder.body):
+        print("first_listing", flush=True)
+        raise urwid.ExitMainLoop
+
+loop.event_loop.enter_idle(on_idle)
+try:
+    loop.event_loop.run()
+except urwid.ExitMainLoop:
+    pass
+"""
+
+
+def startup_benchmarks(path: str, repeat: int):
+    # Cold starts: from the spawning of the interpreter to each milestone
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop("BFM_TRACE", None)
+    times = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", STARTUP_SCRIPT, path],
+            stdout=subprocess.PIPE,
+            env=env,
+            universal_newlines=True,
+        )
+        for line in process.stdout:
+            elapsed = time.perf_counter() - start
+            times.setdefault(line.strip(), []).append(elapsed)
+        process.wait()
+        # For reference: the bare interpreter
+        start = time.perf_counter()
+        subprocess.call([sys.executable, "-c", "pass"], env=env)
+        times.setdefault("interpreter", []).append(time.perf_counter() - start)
+    return {
+        "startup.{}".format(name): {
+            "min": min(values),
+            "median": statistics.median(values),
+            "repeat": len(values),
+        }
+        for name, values in times.items()
+    }
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, min_delta: float
+) -> bool:
+    # Returns True if there is no regression. Slowdowns smaller than
+    # `min_delta` seconds are considered as noise.
+    ok = True
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / max(reference["median"], 1e-9)
+        delta = result["median"] - reference["median"]
+        regression = ratio > threshold and delta > min_delta
+        ok = ok and not regression
+        print(
+            "{:<40} {:>10.2f}ms {:>10.2f}ms {:>7.2f}x{}".format(
+                name,
+                reference["median"] * 1000,
+                result["median"] * 1000,
+                ratio,
+                "  REGRESSION" if regression else "",
+            )
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default="10000,100000",
+        help="sizes of the flat trees, comma separated (e.g. 10000,1000000)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--only", help="only run the benchmarks matching this regex"
+    )
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with these results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio considered as a regression",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.001,
+        help="slowdowns smaller than this (in seconds) are ignored",
+    )
+    args = parser.parse_args()
+
+    # Previews are rendered in-process, no external command is run
+    config.native_previews = True
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bfm-bench-") as tmpdir:
+        trees = {}
+        for size in map(int, args.sizes.split(",")):
+            trees["flat_{}".format(size)] = (build_flat, size)
+        trees["deep"] = (build_deep, None)
+        trees["symlinks"] = (build_symlinks, 10000)
+        trees["mixed"] = (build_mixed, 10000)
+
+        for name, (build, size) in trees.items():
+            if args.only and not re.search(args.only, name):
+                continue
+            path = os.path.join(tmpdir, name)
+            start = time.perf_counter()
+            build(path) if size is None else build(path, size)
+            print(
+                "Built {} in {:.1f}s".format(name, time.perf_counter() - start),
+                file=sys.stderr,
+            )
+            results.update(folder_benchmarks(name, path, args.repeat))
+            results.update(root_benchmarks(name, path, args.repeat))
+        if not args.only or re.search(args.only, "preview"):
+            results.update(preview_benchmarks(args.repeat))
+        if not args.only or re.search(args.only, "startup"):
+            path = os.path.join(tmpdir, "startup")
+            build_flat(path, 10000)
+            results.update(startup_benchmarks(path, args.repeat))
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if not compare(results, baseline, args.threshold, args.min_delta):
+            sys.exit(1)
+    elif not args.output:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
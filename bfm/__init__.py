@@ -1,21 +1,31 @@
 import os
 import sys
 
-import urwid
 
-from .keys import unhandled_input
-from .palette import palette
-from .widgets import RootWidget
+def main():
+    if "--list" in sys.argv[1:]:
+        # NB: no TUI, see `bfm.listing`
+        from .listing import main
 
+        argv = [arg for arg in sys.argv[1:] if arg != "--list"]
+        sys.exit(main(argv))
+
+    # NB: imported here rather than at the top of the module, so that
+    # importing `bfm` (e.g. `bfm.fs` from a script) stays cheap.
+    import urwid
+
+    from .keys import unhandled_input
+    from .main_loop import MainLoop
+    from .palette import palette
+    from .widgets import RootWidget
 
-def main():
     urwid.set_encoding("utf8")
     try:
         path = os.path.abspath(os.path.expanduser(sys.argv[1]))
     except IndexError:
         path = os.getcwd()
     global loop, w_root
-    loop = urwid.MainLoop(
+    loop = MainLoop(
         None,
         palette,
         unhandled_input=unhandled_input,
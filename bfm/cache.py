@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    # NB: The cache is bounded by the total weight of its values, which is
+    # computed by `weigh` (by default, every value weighs 1, i.e. the capacity
+    # is a number of values). When full, the least recently used values are
+    # evicted first.
+    def __init__(
+        self, capacity: int, weigh: Callable[[Any], int] = lambda value: 1
+    ):
+        self.capacity = capacity
+        self.weight = 0
+        self._weigh = weigh
+        self._data = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, _ = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self.pop(key)
+        weight = self._weigh(value)
+        if weight > self.capacity:
+            # Would evict everything else, and still not fit
+            return
+        self._data[key] = (value, weight)
+        self.weight += weight
+        while self.weight > self.capacity:
+            _, (_, evicted_weight) = self._data.popitem(last=False)
+            self.weight -= evicted_weight
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value, weight = self._data.pop(key)
+        except KeyError:
+            return default
+        self.weight -= weight
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.weight = 0
+
+
+def memoize(ttl: float):
+    # Cache the results of a function for `ttl` seconds
+    def decorator(f):
+        cache = {}
+
+        @wraps(f)
+        def wrapper(*args):
+            now = time.monotonic()
+            try:
+                value, expiry = cache[args]
+            except KeyError:
+                pass
+            else:
+                if now < expiry:
+                    return value
+            value = f(*args)
+            cache[args] = (value, now + ttl)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
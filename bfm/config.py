@@ -1,3 +1,101 @@
+import os
+
 folder_preview = 'tree -C -a -L 1 -F "{path}"'
 file_preview = 'bat --color=always --style=numbers --line-range=:500 "{path}"'
 editor = 'vim "{path}"'
+
+# When True, folders are listed like `ls -l` does (toggled with `L`)
+long_listing = False
+# Number of seconds during which user and group names are cached
+owner_cache_ttl = 300
+
+# Maximum number of item widgets kept alive by a folder listing
+widget_cache_size = 256
+
+# The screen is redrawn at most `max_fps` times per second (0 for no limit)
+max_fps = 60
+
+# Folders are sorted by `sort_order`: "name", "natural" (e.g. "v9" before
+# "v10"), "size", "mtime" or "extension" (set with `on`, `ov`, `os`, `om` and
+# `oe`), in reverse when `sort_reverse` is True (toggled with `or`). Folders
+# are always listed first. While the metadata of the items arrives, the
+# listing is sorted again at most every `resort_delay` seconds.
+sort_order = "name"
+sort_reverse = False
+resort_delay = 0.5
+
+# Number of entries in the first batch sent by a directory scan
+scan_batch_size = 1000
+
+# Filesystem events are coalesced during `watch_delay` seconds. If more than
+# `watch_rescan_threshold` items changed, the whole directory is rescanned.
+# `watch_poll_interval` is only used when inotify is not available.
+watch_delay = 0.2
+watch_rescan_threshold = 1000
+watch_poll_interval = 2
+
+# Items are listed before their metadata (size, symlink target, ...) is known.
+# It is then fetched by at most `metadata_workers` threads, and the listing is
+# updated every `metadata_update_delay` seconds, for at most
+# `metadata_time_slice` seconds. An item whose metadata is not fetched after
+# `metadata_timeout` seconds is marked as stale (e.g. on a hung network mount),
+# along with the other items of its folder. As such calls cannot be
+# interrupted, at most `metadata_max_stuck` threads are left hanging; beyond
+# that, metadata is not fetched anymore until one of them returns.
+metadata_workers = 4
+metadata_update_delay = 0.05
+metadata_time_slice = 0.02
+metadata_timeout = 1
+metadata_max_stuck = 32
+
+# Approximate memory (in bytes) used to remember recently visited directories
+snapshot_cache_size = 64 * 1024**2
+
+# Memory (in bytes) used to remember the output of previous previews
+preview_cache_size = 16 * 1024**2
+
+# Previews are only started once the focus stayed `preview_delay` seconds on
+# an item. Then, after `preview_prefetch_delay` seconds, the `preview_prefetch`
+# items above and below it are previewed in the background. At most
+# `preview_max_processes` preview commands run at the same time.
+preview_delay = 0.05
+preview_prefetch_delay = 0.2
+preview_prefetch = 1
+preview_max_processes = 2
+
+# Number of lines read from a preview command, until the preview is rendered
+# (afterwards, its height is used)
+preview_max_lines = 200
+
+# When True, files and folders are previewed by bfm itself, and the preview
+# commands above are only used as a fallback (`:preview rich` switches to the
+# commands, `:preview native` switches back). Native previews read at most
+# `native_preview_max_bytes` of a file, and only list folders with less than
+# `native_preview_max_entries` items (unless they are already cached).
+native_previews = True
+native_preview_max_bytes = 64 * 1024
+native_preview_max_entries = 1000
+
+# Recursive folder sizes (toggled with `du`, sorted with `ds`) are computed by
+# `du_workers` threads, and cached in `du_cache_path`.
+du_workers = 4
+du_cache_path = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "bfm",
+    "du.sqlite3",
+)
+
+# `:find` fuzzy-searches the paths of the tree below the current folder. The
+# paths are kept in an index stored in `index_path`, which is updated in the
+# background every time the finder is opened (unchanged folders are not
+# scanned again). A search runs for at most `finder_time_slice` seconds per
+# iteration of the main loop, and stops after `finder_max_matches` matches,
+# of which the `finder_max_results` best ones are displayed.
+index_path = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "bfm",
+    "index.sqlite3",
+)
+finder_time_slice = 0.02
+finder_max_matches = 10000
+finder_max_results = 100
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+# NB: The disk usage of a folder is computed recursively. For each folder, the
+# total size of its (non folder) items and the names of its subfolders are
+# stored in a persistent cache, keyed by (path, dev, inode, mtime). A folder
+# whose mtime did not change is thus not scanned again: only its subfolders
+# are stat'ed, to check whether they changed in turn.
+# XXX: the mtime of a folder does not change when one of its files grows, so
+# such changes go unnoticed until an item is added to or removed from the
+# folder.
+
+Key = Tuple[bytes, int, int, int]
+
+
+class DiskUsageCache:
+    # NB: Rows are buffered, and written by batches of `commit_rows` (or after
+    # `commit_delay` seconds) in a single transaction, so that the write lock
+    # is only held briefly: other writers (e.g. the other du workers) wait for
+    # it, and give up after `timeout` seconds.
+    # The cache is an optimization only: when it fails (e.g. the database is
+    # locked or not writable), sizes are still computed, without it.
+    commit_rows = 64
+    commit_delay = 0.5
+
+    def __init__(self, path: str, timeout: float = 10):
+        self.path = path
+        self.timeout = timeout
+        # sqlite connections cannot be shared between threads
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS folders ("
+                "path BLOB PRIMARY KEY, dev INTEGER, ino INTEGER, "
+                "mtime INTEGER, size INTEGER, subfolders BLOB)"
+            )
+            self._local.connection = connection
+            self._local.rows = []
+            self._local.since = None
+        return connection
+
+    def get(self, key: Key) -> Optional[Tuple[int, List[bytes]]]:
+        import sqlite3
+
+        try:
+            row = self._connection.execute(
+                "SELECT size, subfolders FROM folders "
+                "WHERE path = ? AND dev = ? AND ino = ? AND mtime = ?",
+                key,
+            ).fetchone()
+        except (OSError, sqlite3.Error):
+            return None
+        if row is None:
+            return None
+        size, subfolders = row
+        return size, subfolders.split(b"\0") if subfolders else []
+
+    def put(self, key: Key, size: int, subfolders: List[bytes]):
+        local = self._local
+        if getattr(local, "rows", None) is None:
+            local.rows = []
+            local.since = None
+        local.rows.append(key + (size, b"\0".join(subfolders)))
+        if local.since is None:
+            local.since = time.monotonic()
+        if (
+            len(local.rows) >= self.commit_rows
+            or time.monotonic() - local.since >= self.commit_delay
+        ):
+            self.commit()
+
+    def commit(self):
+        import sqlite3
+
+        local = self._local
+        rows = getattr(local, "rows", None)
+        if not rows:
+            return
+        local.rows, local.since = [], None
+        try:
+            connection = self._connection
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except (OSError, sqlite3.Error):
+            # NB: the rows are lost, they will simply be computed again
+            pass
+
+
+def disk_usage(
+    path: str,
+    cache: Optional[DiskUsageCache] = None,
+    cancelled: Callable[[], bool] = lambda: False,
+) -> Optional[int]:
+    # Similar to `du -s`. Returns None if cancelled.
+    total = 0
+    stack = [os.fsencode(path)]
+    try:
+        while stack:
+            if cancelled():
+                return None
+            current = stack.pop()
+            try:
+                stats = os.stat(current, follow_symlinks=False)
+            except OSError:
+                continue
+            total += stats.st_blocks * 512
+
+            key = (current, stats.st_dev, stats.st_ino, stats.st_mtime_ns)
+            cached = cache.get(key) if cache else None
+            if cached is None:
+                size, subfolders = _scan(current)
+                if cache:
+                    cache.put(key, size, subfolders)
+            else:
+                size, subfolders = cached
+            total += size
+            stack.extend(os.path.join(current, name) for name in subfolders)
+    finally:
+        if cache:
+            cache.commit()
+    return total
+
+
+def _scan(path: bytes) -> Tuple[int, List[bytes]]:
+    size, subfolders = 0, []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.name)
+                    else:
+                        stats = entry.stat(follow_symlinks=False)
+                        size += stats.st_blocks * 512
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return size, subfolders
@@ -1,20 +1,201 @@
+import collections
 import os
+import queue
+import stat
+import threading
+import time
+from typing import Callable, Iterable, List
 
-import urwid
+from bfm import config, stats
+from bfm.cache import memoize
 
 
-def pretty_name(path: str, basename: bool = True):
-    output = os.path.basename(path) if basename else path
-    if os.path.isdir(path):
-        output += "/"
-    elif os.access(path, os.X_OK):
-        # Mark executable files
-        output += "*"
-    return output
+class Entry:
+    # NB: An `Entry` gathers, once and for all, everything bfm needs to know
+    # about a directory item. It is shared by the item widget, the sorting key,
+    # the preview and the metadata footer, so that none of them has to hit the
+    # filesystem again.
+    # An entry without stat result is a placeholder (see `placeholder`): only
+    # its name and type are known until its metadata is fetched, see
+    # `Hydrator`. `stale` is set when fetching the metadata timed out.
+    # The sorting keys computed for the entry are cached, by order (see
+    # `bfm.sorting`). `sort_keys` is None until the first one is.
+    __slots__ = (
+        "path",
+        "name",
+        "lower_name",
+        "is_dir",
+        "is_link",
+        "stat",
+        "link_target",
+        "executable",
+        "stale",
+        "sort_keys",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        is_dir: bool,
+        is_link: bool,
+        stat_result: os.stat_result = None,
+    ):
+        self.path = path
+        self.name = os.path.basename(path)
+        # Used for sorting and filtering
+        self.lower_name = self.name.lower()
+        self.is_dir = is_dir
+        self.is_link = is_link
+        self.stat = stat_result
+        self.stale = False
+        self.sort_keys = None
+        if stat_result is None:
+            self.link_target = None
+            self.executable = False
+        else:
+            self.link_target = os.readlink(path) if is_link else None
+            self.executable = not is_dir and self._is_executable()
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry):
+        # `os.DirEntry` caches the file type (and the stat result) returned by
+        # the directory listing, hence no extra syscalls for regular items.
+        return cls(
+            entry.path,
+            entry.is_dir(),
+            entry.is_symlink(),
+            entry.stat(follow_symlinks=False),
+        )
+
+    @classmethod
+    def placeholder(cls, entry: os.DirEntry):
+        # NB: no syscall at all, as long as the filesystem reports the type of
+        # the items when listing a directory. The target of a symlink is not
+        # known yet, hence `is_dir` is False for symlinks.
+        return cls(
+            entry.path,
+            entry.is_dir(follow_symlinks=False),
+            entry.is_symlink(),
+        )
+
+    @classmethod
+    def from_path(cls, path: str):
+        stat_result = os.stat(path, follow_symlinks=False)
+        is_link = stat.S_ISLNK(stat_result.st_mode)
+        if is_link:
+            is_dir = os.path.isdir(path)
+        else:
+            is_dir = stat.S_ISDIR(stat_result.st_mode)
+        return cls(path, is_dir, is_link, stat_result)
+
+    @property
+    def hydrated(self) -> bool:
+        return self.stat is not None
+
+    def as_stale(self) -> "Entry":
+        # A copy marked as stale, without hitting the filesystem
+        entry = Entry.__new__(Entry)
+        for attr in Entry.__slots__:
+            setattr(entry, attr, getattr(self, attr))
+        entry.stale = True
+        return entry
+
+    @property
+    def suffix(self) -> str:
+        if self.is_dir:
+            return "/"
+        elif self.executable:
+            # Mark executable files
+            return "*"
+        return ""
+
+    def _is_executable(self) -> bool:
+        # XXX: `os.access` is only called when the mode suggests the item may
+        # be executable. It still needs to be called to take the effective
+        # uid/gid into account, and to follow symlinks.
+        if not self.is_link and not self.stat.st_mode & 0o111:
+            return False
+        return os.access(self.path, os.X_OK)
+
+
+def directory_stamp(path: str):
+    # Changes as soon as an item is added to, removed from or renamed in the
+    # directory.
+    stats = os.stat(path)
+    return stats.st_mtime_ns, stats.st_ctime_ns
+
+
+# NB: resolving names can be slow (e.g. NSS/LDAP), hence the memoization.
+@memoize(ttl=config.owner_cache_ttl)
+def user_name(uid: int) -> str:
+    from pwd import getpwuid
+
+    try:
+        return getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+
+@memoize(ttl=config.owner_cache_ttl)
+def group_name(gid: int) -> str:
+    from grp import getgrgid
+
+    try:
+        return getgrgid(gid).gr_name
+    except KeyError:
+        return str(gid)
+
+
+def format_mtime(
+    stats: os.stat_result, format: str = "%Y-%m-%d %H:%M:%S"
+) -> str:
+    return time.strftime(format, time.gmtime(stats.st_mtime))
+
+
+def format_size(size: float) -> str:
+    # Binary units with one decimal, in the style of `ls -lh` (e.g. "4.2K"),
+    # bytes below 1024 (e.g. "42B"). The smallest unit whose rounded value is
+    # below 1024 is used: e.g. 1048575 is "1.0M" rather than "1024.0K" (as
+    # `humanize.naturalsize(size, gnu=True)` would output).
+    if size < 1024:
+        return "{}B".format(int(size))
+    for suffix in "KMGTPEZY":
+        size /= 1024
+        if round(size, 1) < 1024:
+            break
+    return "{:.1f}{}".format(size, suffix)
+
+
+def long_metadata(entry: Entry, size: str = None) -> str:
+    # Similar to `ls -l`. `size` can be used to override the displayed size.
+    stats = entry.stat
+    if stats is None:
+        return placeholder_metadata(entry)
+    return "{} {:<8} {:<8} {:>6} {}".format(
+        stat.filemode(stats.st_mode),
+        user_name(stats.st_uid),
+        group_name(stats.st_gid),
+        size or format_size(stats.st_size),
+        format_mtime(stats, "%b %d %H:%M"),
+    )
+
+
+def placeholder_metadata(entry: Entry) -> str:
+    # Displayed instead of the metadata that is not known (yet)
+    return "?" if entry.stale else "..."
+
+
+def pretty_name(entry: Entry, basename: bool = True):
+    output = entry.name if basename else entry.path
+    return output + entry.suffix
 
 
 class TreeNavigationMixin:
+    # NB: urwid is imported lazily, so that the rest of this module can be
+    # used without the TUI (see `bfm.listing`).
     def __init__(self):
+        import urwid
+
         self.path = None
         urwid.connect_signal(self, "path_changed", self._on_path_changed)
 
@@ -24,6 +205,8 @@ class TreeNavigationMixin:
         return from_
 
     def change_path(self, new_path: str):
+        import urwid
+
         old_path = self.path
         self.path = new_path
         # XXX: the child class needs to manually define this signal
@@ -34,6 +217,386 @@ class TreeNavigationMixin:
         self.change_path(new_path)
 
     def scanpath(self, path=None):
-        with os.scandir(path or self.path) as it:
-            for entry in it:
-                yield entry.path
+        return scanpath(path or self.path)
+
+
+@stats.timed("scanpath")
+def scanpath(path: str, hydrate: bool = True):
+    # When `hydrate` is False, placeholders are yielded (see `Entry`)
+    factory = Entry.from_dir_entry if hydrate else Entry.placeholder
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                yield factory(entry)
+            except OSError:
+                # The item vanished in the meantime
+                continue
+
+
+class Scanner(threading.Thread):
+    # NB: A `Scanner` enumerates a directory in a worker thread. Entries are
+    # grouped into batches, which are pushed to a queue. `notify` is called
+    # (from the worker thread) each time something is pushed, so that the
+    # consumer knows when to call `drain`.
+    def __init__(
+        self,
+        path: str,
+        notify: Callable[[], None] = lambda: None,
+        batch_size: int = 1000,
+        batch_delay: float = 0.05,
+        hydrate: bool = True,
+    ):
+        super().__init__(daemon=True)
+        self.path = path
+        self.hydrate = hydrate
+        self.count = 0
+        self.stamp = None
+        self.done = False
+        self.error = None
+        self._notify = notify
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+        self._cancelled = threading.Event()
+        self._queue = queue.SimpleQueue()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        # XXX: a worker blocked inside a syscall cannot be interrupted, but its
+        # results will be discarded anyway.
+        self._cancelled.set()
+
+    def drain(self):
+        # Yield the batches pushed so far. Must be called from the consumer
+        # thread.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                self.done = True
+            elif isinstance(item, OSError):
+                self.error = item
+            else:
+                self.count += len(item)
+                yield item
+
+    def run(self):
+        try:
+            # NB: taken before the scan starts, so that any change happening
+            # in the meantime invalidates the stamp.
+            self.stamp = directory_stamp(self.path)
+            batch = []
+            deadline = time.monotonic() + self._batch_delay
+            for entry in scanpath(self.path, self.hydrate):
+                if self.cancelled:
+                    return
+                batch.append(entry)
+                if (
+                    len(batch) >= self._batch_size
+                    or time.monotonic() >= deadline
+                ):
+                    self._push(batch)
+                    batch = []
+                    # NB: batches get bigger and bigger, so that the consumer
+                    # only handles a logarithmic number of them.
+                    self._batch_size *= 2
+                    self._batch_delay *= 2
+                    deadline = time.monotonic() + self._batch_delay
+            if batch:
+                self._push(batch)
+        except OSError as e:
+            self._push(e)
+        finally:
+            self._push(None)
+
+    def _push(self, item):
+        if not self.cancelled:
+            self._queue.put(item)
+            self._notify()
+
+
+class SharedScanner:
+    # NB: Lets several consumers (e.g. two panes showing the same folder) share
+    # the ongoing scans: a directory is not scanned again while it is being
+    # scanned. `scan` returns a `ScanHandle`, which has the same interface as
+    # `Scanner`. Its `drain` yields all the batches of the scan, including the
+    # ones drained by the other consumers before it joined.
+    # XXX: a consumer joining a scan gets the content of the directory when
+    # the scan started. Later changes are noticed by watching it.
+    def __init__(self, batch_size: int = 1000, hydrate: bool = True):
+        self._batch_size = batch_size
+        self._hydrate = hydrate
+        self._scans = {}  # path -> (scanner, batches, handles)
+
+    def scan(self, path: str, notify: Callable[[], None]) -> "ScanHandle":
+        scan = self._scans.get(path)
+        if scan is None:
+            handles = []
+
+            def notify_all():
+                for handle in list(handles):
+                    handle.notify()
+
+            scanner = Scanner(
+                path, notify_all, self._batch_size, hydrate=self._hydrate
+            )
+            scan = self._scans[path] = (scanner, [], handles)
+            handle = ScanHandle(self, path, notify, scan)
+            scanner.start()
+        else:
+            handle = ScanHandle(self, path, notify, scan)
+            # The batches drained so far are available right away
+            notify()
+        return handle
+
+    def _discard(self, path: str, scan: tuple):
+        if self._scans.get(path) is scan:
+            del self._scans[path]
+
+
+class ScanHandle:
+    # A consumer of a shared scan, see `SharedScanner`
+    def __init__(
+        self,
+        owner: SharedScanner,
+        path: str,
+        notify: Callable[[], None],
+        scan: tuple,
+    ):
+        self.path = path
+        self.notify = notify
+        self.count = 0
+        self._owner = owner
+        self._scan = scan
+        self._position = 0
+        scan[2].append(self)
+
+    @property
+    def hydrate(self) -> bool:
+        return self._scan[0].hydrate
+
+    @property
+    def stamp(self):
+        return self._scan[0].stamp
+
+    @property
+    def error(self):
+        return self._scan[0].error
+
+    @property
+    def done(self) -> bool:
+        return self._scan[0].done and self._position == len(self._scan[1])
+
+    def cancel(self):
+        # The scan goes on as long as other consumers follow it
+        scanner, _, handles = self._scan
+        if self in handles:
+            handles.remove(self)
+        if not handles:
+            scanner.cancel()
+            self._owner._discard(self.path, self._scan)
+
+    def drain(self):
+        # Must be called from the consumer thread
+        scanner, batches, _ = self._scan
+        batches.extend(scanner.drain())
+        if scanner.done:
+            # NB: consumers coming later start a new scan
+            self._owner._discard(self.path, self._scan)
+        while self._position < len(batches):
+            batch = batches[self._position]
+            self._position += 1
+            self.count += len(batch)
+            yield batch
+
+
+class Hydrator:
+    # NB: A `Hydrator` fetches the metadata of items (see `Entry.from_path`)
+    # with a bounded pool of worker threads, so that a slow item (e.g. on a
+    # hung network mount) does not hold back the others. Workers take the
+    # paths by chunks, and stop when there is nothing left to do. Like with
+    # `Scanner`, `notify` is called (from a worker thread) when results can be
+    # drained. A result is either an `Entry` or an `OSError`.
+    # Local filesystems answer way faster than the GIL is handed over, so more
+    # workers would only slow the main loop down: a single worker is started,
+    # and another one is added each time a chunk took more than `slow`
+    # seconds per path (i.e. the filesystem is the bottleneck), up to
+    # `workers`.
+    # XXX: a syscall cannot be interrupted. Once a call lasted more than
+    # `timeout` seconds, `expire` reports it along with the other pending
+    # paths of its folder (which would most likely hang too), the rest of its
+    # chunk is given back, and its worker is replaced. At most `max_stuck`
+    # workers may be stuck at once: beyond that, no worker is started and the
+    # pending paths are expired as well, until a stuck call returns.
+    def __init__(
+        self,
+        notify: Callable[[], None] = lambda: None,
+        workers: int = 4,
+        timeout: float = 1.0,
+        chunk_size: int = 64,
+        slow: float = 0.001,
+        max_stuck: int = 32,
+    ):
+        self._notify = notify
+        self._max_workers = workers
+        self._max_stuck = max_stuck
+        self._timeout = timeout
+        self._slow = slow
+        self._chunk_size = chunk_size
+        self._condition = threading.Condition()
+        self._pending = collections.deque()
+        self._queued = set()
+        # Maps each busy worker to its chunk of paths, the position of the
+        # path being handled, and since when.
+        self._running = {}
+        self._workers = 0
+        self._stuck = set()
+        self._notified = False
+        self._results = queue.SimpleQueue()
+
+    @property
+    def idle(self) -> bool:
+        with self._condition:
+            return not self._queued and len(self._running) == len(self._stuck)
+
+    def submit(self, paths: Iterable[str], first: bool = False):
+        # `first` puts the paths ahead of the already submitted ones, e.g.
+        # for the visible items.
+        with self._condition:
+            if first:
+                paths = list(paths)
+                self._pending.extendleft(reversed(paths))
+            else:
+                paths = [path for path in paths if path not in self._queued]
+                self._pending.extend(paths)
+            self._queued.update(paths)
+            self._spawn(1)
+
+    def clear(self, keep: Callable[[str], bool] = None):
+        # Forget the pending paths, except the ones for which `keep` returns
+        # True. Results of the running calls are still reported.
+        with self._condition:
+            if keep is None:
+                self._pending.clear()
+                self._queued.clear()
+            else:
+                self._pending = collections.deque(filter(keep, self._pending))
+                self._queued = set(filter(keep, self._queued))
+
+    def expire(self) -> List[str]:
+        # Returns the paths whose call lasts for more than `timeout` seconds,
+        # and the pending paths given up on (see above), each of them only
+        # once. Meant to be called periodically.
+        deadline = time.monotonic() - self._timeout
+        expired = []
+        with self._condition:
+            folders = set()
+            for worker, (chunk, i, start) in list(self._running.items()):
+                if start < deadline and worker not in self._stuck:
+                    self._stuck.add(worker)
+                    self._workers -= 1
+                    expired.append(chunk[i])
+                    folders.add(os.path.dirname(chunk[i]))
+                    rest = chunk[i:][1:]
+                    self._pending.extendleft(reversed(rest))
+                    self._queued.update(rest)
+            if self._workers == 0 and len(self._stuck) >= self._max_stuck:
+                expired.extend(self._dequeue(lambda path: True))
+            elif folders:
+                expired.extend(
+                    self._dequeue(lambda path: os.path.dirname(path) in folders)
+                )
+            self._spawn(1)
+        return expired
+
+    def drain(self):
+        # Yield (path, result) pairs. Must be called from the consumer thread.
+        with self._condition:
+            self._notified = False
+        while True:
+            try:
+                yield from self._results.get_nowait()
+            except queue.Empty:
+                return
+
+    def _dequeue(self, predicate: Callable[[str], bool]) -> List[str]:
+        # Forget the pending paths for which `predicate` returns True, and
+        # return them. XXX: must be called with the lock held
+        paths = [p for p in self._queued if predicate(p)]
+        if paths:
+            self._queued.difference_update(paths)
+            self._pending = collections.deque(
+                p for p in self._pending if p in self._queued
+            )
+        return paths
+
+    def _spawn(self, count: int):
+        # Ensure that `count` workers are running, if there is enough to do.
+        # XXX: must be called with the lock held
+        while (
+            self._workers < min(count, self._max_workers)
+            and self._workers * self._chunk_size < len(self._pending)
+            and len(self._stuck) < self._max_stuck
+        ):
+            self._workers += 1
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _next_chunk(self) -> List[str]:
+        # XXX: must be called with the lock held. Paths submitted twice are
+        # only handled once.
+        chunk = []
+        while self._pending and len(chunk) < self._chunk_size:
+            path = self._pending.popleft()
+            if path in self._queued:
+                self._queued.discard(path)
+                chunk.append(path)
+        return chunk
+
+    def _work(self):
+        worker = threading.current_thread()
+        stuck = False
+        while not stuck:
+            with self._condition:
+                chunk = self._next_chunk()
+                if not chunk:
+                    self._workers -= 1
+                    return
+            results = []
+            start = time.monotonic()
+            for i, path in enumerate(chunk):
+                # NB: no lock needed, a single item assignment is atomic
+                self._running[worker] = (chunk, i, time.monotonic())
+                # NB: cheaper than `stats.timer` when disabled
+                timed = stats.enabled and time.perf_counter()
+                try:
+                    result = Entry.from_path(path)
+                except OSError as e:
+                    result = e
+                if timed:
+                    stats.record("stat", time.perf_counter() - timed, timed)
+                results.append((path, result))
+                if worker in self._stuck:
+                    # The rest of the chunk was given back, and the worker
+                    # replaced. NB: late results are reported too.
+                    with self._condition:
+                        self._stuck.discard(worker)
+                        self._spawn(1)
+                    stuck = True
+                    break
+            with self._condition:
+                del self._running[worker]
+                if time.monotonic() - start > self._slow * len(chunk):
+                    self._spawn(self._workers + 1)
+            self._push(results)
+
+    def _push(self, results: list):
+        self._results.put(results)
+        with self._condition:
+            notify = not self._notified
+            self._notified = True
+        if notify:
+            self._notify()
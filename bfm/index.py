@@ -0,0 +1,191 @@
+import os
+import re
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, Iterator, List, Optional
+
+# NB: The index stores, for each folder of the tree, its mtime and the names
+# of its items. When the index is updated, a folder whose mtime did not change
+# is not scanned again: its stored names are used instead (its subfolders are
+# still visited, since the mtime of a folder does not reflect changes deeper
+# in the tree).
+# The stored folders are committed as the update goes (even when it is
+# cancelled), so that the index of a huge tree is built over several updates.
+# Meanwhile, `load` lists the stored paths without hitting the filesystem.
+
+
+class FileIndex:
+    # Stored folders are committed every `commit_delay` seconds
+    commit_delay = 1.0
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self):
+        # XXX: sqlite connections cannot be shared between threads, hence a
+        # connection per update.
+        import sqlite3
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS folders ("
+            "path BLOB PRIMARY KEY, mtime INTEGER, names BLOB)"
+        )
+        return connection
+
+    def load(self, root: str) -> List[str]:
+        # Like `update`, from the stored folders only (the ones not indexed
+        # yet are missing).
+        paths = []
+        connection = self._connect()
+        try:
+            stack = [""]
+            while stack:
+                relpath = stack.pop()
+                path = os.fsencode(os.path.join(root, relpath))
+                row = connection.execute(
+                    "SELECT names FROM folders WHERE path = ?", (path,)
+                ).fetchone()
+                if row is None or not row[0]:
+                    continue
+                for name in os.fsdecode(row[0]).split("\0"):
+                    name = os.path.join(relpath, name)
+                    paths.append(name)
+                    if name.endswith("/"):
+                        stack.append(name[:-1])
+        finally:
+            connection.close()
+        return paths
+
+    def update(
+        self, root: str, cancelled: Callable[[], bool] = lambda: False
+    ) -> Optional[List[str]]:
+        # Returns the paths (relative to `root`) of all the items of the tree,
+        # folders having a trailing "/". Returns None if cancelled.
+        paths = []
+        connection = self._connect()
+        deadline = time.monotonic() + self.commit_delay
+        try:
+            stack = [""]
+            while stack:
+                if cancelled():
+                    return None
+                if time.monotonic() > deadline:
+                    connection.commit()
+                    deadline = time.monotonic() + self.commit_delay
+                relpath = stack.pop()
+                path = os.fsencode(os.path.join(root, relpath))
+                try:
+                    mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+                except OSError:
+                    continue
+                row = connection.execute(
+                    "SELECT mtime, names FROM folders WHERE path = ?", (path,)
+                ).fetchone()
+                if row is not None and row[0] == mtime:
+                    names = os.fsdecode(row[1]).split("\0") if row[1] else []
+                else:
+                    names = _scan(path)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                        (path, mtime, os.fsencode("\0".join(names))),
+                    )
+                for name in names:
+                    name = os.path.join(relpath, name)
+                    paths.append(name)
+                    if name.endswith("/"):
+                        stack.append(name[:-1])
+        finally:
+            connection.commit()
+            connection.close()
+        return paths
+
+
+def _scan(path: bytes) -> List[str]:
+    names = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                name = os.fsdecode(entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        name += "/"
+                except OSError:
+                    pass
+                names.append(name)
+    except OSError:
+        pass
+    return names
+
+
+class FuzzySearch:
+    # NB: Paths are grouped in chunks. Each chunk is a single lowercase string
+    # (one path per line), so that a regular expression can look for matches
+    # in a whole chunk at once, instead of looping over every path in Python.
+    # `search` yields after each chunk, so that a long search can be spread
+    # over several iterations of the main loop.
+    CHUNK_SIZE = 1 << 13
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+        self._chunks = []
+        for start in range(0, len(paths), self.CHUNK_SIZE):
+            end = start + self.CHUNK_SIZE
+            lines = [p.lower() for p in paths[start:end]]
+            offsets = [0]
+            offsets.extend(accumulate(len(line) + 1 for line in lines))
+            self._chunks.append((start, "\n".join(lines), offsets))
+
+    @staticmethod
+    def compile(query: str):
+        # "abc" matches any path containing "a", then "b", then "c"
+        chars = map(re.escape, query.lower())
+        return re.compile("[^\n]*?".join(chars))
+
+    def search(
+        self,
+        query: str,
+        max_matches: int,
+        candidates: Optional[List[int]] = None,
+    ) -> Iterator[List[int]]:
+        # Yields lists of indices of matching paths, stopping after
+        # `max_matches` matches. `candidates` can be used to refine the
+        # (complete) matches of a previous query, when the new query extends
+        # it.
+        pattern = self.compile(query)
+        if candidates is not None:
+            yield [
+                i for i in candidates if pattern.search(self.paths[i].lower())
+            ]
+            return
+
+        count = 0
+        for start, blob, offsets in self._chunks:
+            matches = []
+            pos = 0
+            while count < max_matches:
+                m = pattern.search(blob, pos)
+                if m is None:
+                    break
+                line = bisect_right(offsets, m.start()) - 1
+                matches.append(start + line)
+                count += 1
+                # Look for the next match from the next line
+                pos = offsets[line + 1]
+            yield matches
+            if count >= max_matches:
+                return
+
+    def rank(self, query: str, matches: List[int], count: int) -> List[int]:
+        # Best matches first: matches in the basename, then shorter paths
+        pattern = self.compile(query)
+
+        def key(i):
+            path = self.paths[i]
+            basename = os.path.basename(path.rstrip("/"))
+            return (not pattern.search(basename.lower()), len(path))
+
+        return sorted(matches, key=key)[:count]
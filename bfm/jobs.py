@@ -0,0 +1,291 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from bfm.fs import format_size
+
+# Size of the chunks copied at once. Cancellation and progress are checked
+# between chunks.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class BatchJob(threading.Thread):
+    # NB: A `BatchJob` applies `operation` to each path of a batch, in a worker
+    # thread. Results and errors are collected as it goes, and `notify` is
+    # called (from the worker thread) at most every `notify_delay` seconds to
+    # report progress, and once more when the job is over.
+    # `removes_sources` tells whether the paths no longer exist once
+    # processed.
+    removes_sources = True
+
+    def __init__(
+        self,
+        title: str,
+        operation: Callable[[str], Any],
+        paths: List[str],
+        notify: Callable[[], None] = lambda: None,
+        notify_delay: float = 0.1,
+    ):
+        super().__init__(daemon=True)
+        self.title = title
+        self.paths = paths
+        self.count = 0
+        self.results = []  # (path, result)
+        self.errors = []  # (path, exception)
+        self.done = False
+        self.notify = notify
+        self._operation = operation
+        self._notify_delay = notify_delay
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def progress(self) -> str:
+        return "{} {}/{}".format(self.title, self.count, len(self.paths))
+
+    def run(self):
+        deadline = time.monotonic() + self._notify_delay
+        try:
+            for path in self.paths:
+                if self.cancelled:
+                    break
+                try:
+                    result = self._operation(path)
+                except JobCancelled:
+                    break
+                except Exception as e:
+                    # e.g. send2trash raises various exceptions
+                    self.errors.append((path, e))
+                else:
+                    self.results.append((path, result))
+                self.count += 1
+                if time.monotonic() >= deadline:
+                    self.notify()
+                    deadline = time.monotonic() + self._notify_delay
+        finally:
+            self.done = True
+            self.notify()
+
+
+class TransferJob(BatchJob):
+    # NB: Copies (or moves) each path to its destination, given by
+    # `destinations`. Files are copied by the kernel when possible, see
+    # `copy_file`. A move is a simple rename, unless the destination is on
+    # another device, in which case the path is copied then removed.
+    # Like `cp`, a folder is never copied into itself, and special files are
+    # recreated rather than read (reading a FIFO would block forever).
+    def __init__(
+        self,
+        destinations: Dict[str, str],
+        move: bool = False,
+        notify: Callable[[], None] = lambda: None,
+    ):
+        title = "Move" if move else "Copy"
+        super().__init__(title, self._transfer, list(destinations), notify)
+        self.removes_sources = move
+        self.destinations = destinations
+        self.move = move
+        self.total_bytes = None
+        self.bytes_done = 0
+        self._sizes = {}
+        self._start = None
+
+    @property
+    def progress(self) -> str:
+        progress = super().progress
+        if self.total_bytes and self._start is not None:
+            elapsed = max(time.monotonic() - self._start, 1e-3)
+            progress += " {}% {}/s".format(
+                100 * self.bytes_done // self.total_bytes,
+                format_size(self.bytes_done / elapsed),
+            )
+        return progress
+
+    def run(self):
+        for path in self.paths:
+            try:
+                self._sizes[path] = _size(path)
+            except OSError:
+                self._sizes[path] = 0
+        self.total_bytes = sum(self._sizes.values())
+        self._start = time.monotonic()
+        super().run()
+
+    def _transfer(self, src: str) -> str:
+        dst = self.destinations[src]
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, "File exists", dst)
+        if os.path.isdir(src) and not os.path.islink(src):
+            src_real, dst_real = os.path.realpath(src), os.path.realpath(dst)
+            if os.path.commonpath([src_real, dst_real]) == src_real:
+                raise OSError(
+                    errno.EINVAL, "Cannot copy a folder into itself", dst
+                )
+        parent = os.path.dirname(dst)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if self.move:
+            try:
+                os.rename(src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+            else:
+                self.bytes_done += self._sizes.get(src, 0)
+                return dst
+        try:
+            self._copy(src, dst)
+        except BaseException:
+            _remove(dst)
+            raise
+        if self.move:
+            _remove(src)
+        return dst
+
+    def _copy(self, src: str, dst: str):
+        st = os.lstat(src)
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(src), dst)
+        elif stat.S_ISDIR(st.st_mode):
+            os.mkdir(dst)
+            with os.scandir(src) as it:
+                names = [entry.name for entry in it]
+            for name in names:
+                self._copy(os.path.join(src, name), os.path.join(dst, name))
+            shutil.copystat(src, dst)
+        elif stat.S_ISREG(st.st_mode):
+            copy_file(src, dst, self._on_copied, lambda: self.cancelled)
+            shutil.copystat(src, dst)
+        elif stat.S_ISFIFO(st.st_mode):
+            os.mkfifo(dst, stat.S_IMODE(st.st_mode))
+            shutil.copystat(src, dst)
+        elif stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+            # NB: usually needs privileges
+            os.mknod(dst, st.st_mode, st.st_rdev)
+            shutil.copystat(src, dst)
+        else:
+            # e.g. a socket
+            raise shutil.SpecialFileError(
+                "`{}` is a special file and cannot be copied".format(src)
+            )
+
+    def _on_copied(self, size: int):
+        self.bytes_done += size
+
+
+def copy_file(
+    src: str,
+    dst: str,
+    progress: Callable[[int], None] = lambda size: None,
+    cancelled: Callable[[], bool] = lambda: False,
+):
+    # Copies the content of `src` to `dst`, without going through userspace
+    # when possible: `copy_file_range` (which may even share the data blocks
+    # on some filesystems), then `sendfile`, then buffered chunks. Each
+    # method continues where the previous one stopped.
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        for method in _COPY_METHODS:
+            try:
+                if method(infd, outfd, progress, cancelled):
+                    return
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+
+
+# Errors meaning that a copy method cannot be used for these files
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+}
+
+
+def _copy_file_range(infd, outfd, progress, cancelled) -> bool:
+    # NB: Returns False when nothing could be copied, e.g. for files whose
+    # size is not known by the kernel (like in /proc).
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copied = 0
+    while True:
+        if cancelled():
+            raise JobCancelled
+        size = os.copy_file_range(infd, outfd, CHUNK_SIZE)
+        if size == 0:
+            return copied > 0 or os.fstat(infd).st_size == 0
+        copied += size
+        progress(size)
+
+
+def _sendfile(infd, outfd, progress, cancelled) -> bool:
+    copied = 0
+    while True:
+        if cancelled():
+            raise JobCancelled
+        size = os.sendfile(outfd, infd, None, CHUNK_SIZE)
+        if size == 0:
+            return copied > 0 or os.fstat(infd).st_size == 0
+        copied += size
+        progress(size)
+
+
+def _copy_buffered(infd, outfd, progress, cancelled) -> bool:
+    buffer = memoryview(bytearray(1024 * 1024))
+    with open(infd, "rb", buffering=0, closefd=False) as f:
+        while True:
+            if cancelled():
+                raise JobCancelled
+            size = f.readinto(buffer)
+            if not size:
+                return True
+            view = buffer[:size]
+            while view:
+                written = os.write(outfd, view)
+                view = view[written:]
+            progress(size)
+
+
+_COPY_METHODS = [_copy_file_range, _sendfile, _copy_buffered]
+
+
+def _size(path: str) -> int:
+    # Size of the regular files of a tree, symlinks are not followed
+    total = 0
+    stack = [path]
+    while stack:
+        path = stack.pop()
+        st = os.lstat(path)
+        if stat.S_ISREG(st.st_mode):
+            total += st.st_size
+        elif stat.S_ISDIR(st.st_mode):
+            with os.scandir(path) as it:
+                stack.extend(entry.path for entry in it)
+    return total
+
+
+def _remove(path: str):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,9 +1,20 @@
+import inspect
+import re
+from functools import lru_cache
+from typing import List, Optional
+
 import urwid
 from urwid.command_map import CommandMap
 
 # Clear all widgets default command map
 urwid.command_map._command.clear()
 
+# Counts are capped, e.g. "99999j" moves by `MAX_COUNT` items. Commands which
+# do not accept a count, but are marked as `repeatable`, are run at most
+# `MAX_REPEAT` times (synchronously).
+MAX_COUNT = 10000
+MAX_REPEAT = 100
+
 
 def escape(key):
     # TODO: handle meta, ctrl, etc
@@ -14,34 +25,90 @@ def escape(key):
     return key if len(key) == 1 else ("<%s>" % key)
 
 
+def split_keys(keys: str) -> List[str]:
+    # Inverse of `"".join(map(escape, ...))`, e.g. "g<down>" -> ["g", "<down>"]
+    return re.findall(r"<[^>]+>|\\.|.", keys)
+
+
+class KeyTrie:
+    # NB: Each node maps an (escaped) key to the node of the sequences
+    # continuing with that key. `command` is set on nodes ending a sequence.
+    __slots__ = ("children", "command")
+
+    def __init__(self):
+        self.children = {}
+        self.command = None
+
+    def insert(self, keys: List[str], command):
+        node = self
+        for key in keys:
+            node = node.children.setdefault(key, KeyTrie())
+        node.command = command
+
+    def find(self, keys: List[str]) -> Optional["KeyTrie"]:
+        node = self
+        for key in keys:
+            node = node.children.get(key)
+            if node is None:
+                return None
+        return node
+
+
+# All the key sequences of all the command maps, used to know whether pending
+# keys may still lead to a command.
+all_commands = KeyTrie()
+
+
 def unhandled_input(key):
     if key == "esc":
         input_state.clear()
+    elif input_state.push(key):
+        pass
+    elif not input_state.keys and key.isdigit():
+        # NB: a count can only be given before a key sequence, e.g. "20j"
+        input_state.push_digit(key)
     else:
-        input_state.push(key)
-        if not any(
-            keys.startswith(str(input_state))
-            for keys in ExtendedCommandMap.all_command_keys
-        ):
-            input_state.clear()
+        input_state.clear()
 
 
 class InputState:
+    # NB: Holds the keys of the sequence being typed, along with the trie node
+    # they lead to, so that checking the next key only costs a lookup.
     def __init__(self):
-        self._queue = []
+        self.keys = []
+        self.count = None
+        self._node = all_commands
         self._alarm_handle = None
 
     def __str__(self):
-        return "".join(map(escape, self._queue))
+        return "".join(self.keys)
 
     def clear(self):
-        self._queue.clear()
-
-    def push(self, key: str):
+        self.keys = []
+        self.count = None
+        self._node = all_commands
+
+    def push(self, key: str) -> bool:
+        # Returns False if no command starts with the pending keys and `key`
+        key = escape(key)
+        node = self._node.children.get(key)
+        if node is None:
+            return False
+        self.keys = self.keys + [key]
+        self._node = node
+        self._reset_timeout()
+        return True
+
+    def push_digit(self, digit: str):
+        if self.count is None and digit == "0":
+            return
+        self.count = min((self.count or 0) * 10 + int(digit), MAX_COUNT)
+        self._reset_timeout()
+
+    def _reset_timeout(self):
         from . import loop
 
         loop.remove_alarm(self._alarm_handle)
-        self._queue.append(key)
         self._alarm_handle = loop.set_alarm_in(1, lambda *_: self.clear())
 
 
@@ -49,19 +116,40 @@ input_state = InputState()
 
 
 class ExtendedCommandMap(CommandMap):
-    all_command_keys = []
-
     def __init__(self, command_defaults={}, aliases={}):
         self._command_defaults = command_defaults
         self._aliases = aliases
-        ExtendedCommandMap.all_command_keys.extend(command_defaults.keys())
-        ExtendedCommandMap.all_command_keys.extend(aliases.keys())
         super().__init__()
+        self._trie = KeyTrie()
+        for keys, command in command_defaults.items():
+            self._insert(keys, command)
+        for alias, keys in aliases.items():
+            self._insert(alias, command_defaults[keys])
+
+    def _insert(self, keys: str, command):
+        keys = split_keys(keys)
+        self._trie.insert(keys, command)
+        all_commands.insert(keys, True)
 
     def __getitem__(self, key):
-        keys = str(input_state) + escape(key)
-        keys = self._aliases.get(keys, keys)
-        return self._command.get(keys, None)
+        node = self._trie.find(input_state.keys)
+        if node is None:
+            return None
+        node = node.children.get(escape(key))
+        return None if node is None else node.command
+
+
+@lru_cache(maxsize=None)
+def takes_count(command) -> bool:
+    # Whether a command accepts a count, i.e. has a second parameter
+    return len(inspect.signature(command).parameters) > 1
+
+
+def repeatable(command):
+    # Mark a command which does not accept a count as being repeated when
+    # given one, e.g. "3h". The count is ignored by the other ones.
+    command.repeatable = True
+    return command
 
 
 class CallableCommandsMixin:
@@ -70,6 +158,17 @@ class CallableCommandsMixin:
         if key:
             command = self._command_map[key]
             if callable(command):
-                command(self)
+                count = input_state.count
+                if count is None:
+                    command(self)
+                elif takes_count(command):
+                    # NB: the command applies the count at once, e.g. a
+                    # single focus change for "20j".
+                    command(self, count)
+                elif getattr(command, "repeatable", False):
+                    for _ in range(min(count, MAX_REPEAT)):
+                        command(self)
+                else:
+                    command(self)
                 return
         return key
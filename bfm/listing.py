@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import stat
+import sys
+from typing import Callable, Iterator, List
+
+from bfm import config
+from bfm.fs import Entry, group_name, scanpath, user_name
+from bfm.sorting import orders, sort_entries
+
+# NB: `bfm --list` streams the items of a folder, without the TUI (urwid is
+# not even imported). The scan, the metadata and the sorting are the ones of
+# the listing, so that scripts see the items the same way.
+
+FIELDS = (
+    "path",
+    "name",
+    "type",
+    "suffix",
+    "size",
+    "mtime",
+    "mode",
+    "user",
+    "group",
+    "target",
+)
+
+
+def walk(
+    path: str,
+    order: str = "name",
+    reverse: bool = False,
+    text: str = "",
+    depth: int = 1,
+    on_error: Callable[[OSError], None] = None,
+) -> Iterator[Entry]:
+    # Yield the items of `path` whose lowercase name contains `text`, and
+    # those of its subfolders down to `depth` levels (symlinks are not
+    # followed). The items of a subfolder come right after it.
+    # NB: each folder is sorted on its own, i.e. only the folders being walked
+    # are held in memory. When `order` is None, the items are yielded as they
+    # are scanned, in constant memory.
+    # Errors in subfolders are given to `on_error`, and the walk goes on.
+    entries = scanpath(path)
+    if order is not None:
+        entries = sort_entries(entries, orders[order], reverse)
+    for entry in entries:
+        if text in entry.lower_name:
+            yield entry
+        if depth > 1 and entry.is_dir and not entry.is_link:
+            try:
+                yield from walk(
+                    entry.path, order, reverse, text, depth - 1, on_error
+                )
+            except OSError as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+
+
+def entry_type(entry: Entry) -> str:
+    # Like the colors of the listing
+    if entry.is_link:
+        return "link"
+    elif entry.is_dir:
+        return "dir"
+    return "file"
+
+
+def to_dict(entry: Entry) -> dict:
+    stats = entry.stat
+    return {
+        "path": entry.path,
+        "name": entry.name,
+        "type": entry_type(entry),
+        # e.g. "/" for folders and symlinks to folders, "*" for executables
+        "suffix": entry.suffix,
+        "size": stats.st_size,
+        "mtime": stats.st_mtime,
+        "mode": stat.filemode(stats.st_mode),
+        "user": user_name(stats.st_uid),
+        "group": group_name(stats.st_gid),
+        "target": entry.link_target,
+    }
+
+
+def format_ndjson(entry: Entry) -> str:
+    # NB: the bytes of undecodable names are escaped as lone surrogates, e.g.
+    # b"\xff" as "\udcff" (see `os.fsdecode`). Python reads them back with
+    # `os.fsencode(json.loads(line)["path"])`, stricter parsers may not.
+    return json.dumps(to_dict(entry))
+
+
+def _escape(value) -> str:
+    if value is None:
+        return ""
+    value = str(value)
+    for char, escaped in [("\\", "\\\\"), ("\t", "\\t"), ("\n", "\\n")]:
+        value = value.replace(char, escaped)
+    return value
+
+
+def format_tsv(entry: Entry) -> str:
+    # The fields of `FIELDS`, without header. Tabs, newlines and backslashes
+    # are escaped (e.g. "\t").
+    values = to_dict(entry)
+    return "\t".join(_escape(values[field]) for field in FIELDS)
+
+
+formats = {"ndjson": format_ndjson, "tsv": format_tsv}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="bfm --list",
+        description="List the items of a folder, one per line.",
+        epilog=(
+            "Fields: {}. Undecodable bytes in names are written as they are "
+            "with --format tsv, and escaped as lone surrogates (e.g. "
+            "\\udcff) with --format ndjson."
+        ).format(", ".join(FIELDS)),
+    )
+    parser.add_argument("path", nargs="?", default=os.curdir)
+    parser.add_argument("--format", choices=sorted(formats), default="ndjson")
+    parser.add_argument(
+        "--sort",
+        choices=sorted(orders) + ["none"],
+        default=config.sort_order,
+        help="'none' lists the items as they are scanned, in constant memory",
+    )
+    parser.add_argument(
+        "--reverse", action="store_true", default=config.sort_reverse
+    )
+    parser.add_argument(
+        "--filter",
+        default="",
+        metavar="TEXT",
+        help="only list the items whose name contains TEXT (ignoring case)",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=1,
+        help="list the subfolders down to DEPTH levels",
+    )
+    args = parser.parse_args(argv)
+
+    errors = []
+
+    def on_error(error: OSError):
+        errors.append(error)
+        print("bfm: {}".format(error), file=sys.stderr)
+
+    path = os.path.expanduser(args.path)
+    order = None if args.sort == "none" else args.sort
+    entries = walk(
+        path, order, args.reverse, args.filter.lower(), args.depth, on_error
+    )
+    format = formats[args.format]
+    out = sys.stdout.buffer
+    try:
+        for entry in entries:
+            # NB: with `format_tsv`, undecodable names are written back as
+            # they are
+            out.write(os.fsencode(format(entry)) + b"\n")
+        out.flush()
+    except OSError as e:
+        if isinstance(e, BrokenPipeError):
+            # e.g. piped into `head`. NB: stdout is redirected to devnull, so
+            # that flushing it again at exit does not fail.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+        on_error(e)
+        return 1
+    return 1 if errors else 0
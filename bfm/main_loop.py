@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+import urwid
+
+from bfm import config
+
+
+class MainLoop(urwid.MainLoop):
+    # NB: urwid redraws the screen every time the event loop becomes idle. The
+    # redraws are limited to `config.max_fps` per second: a redraw happening
+    # too soon after the previous one is postponed, and everything that
+    # changed in the meantime is drawn at once.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_draw = 0
+        self._draw_alarm = None
+
+    def entering_idle(self):
+        if config.max_fps:
+            delay = self._last_draw + 1 / config.max_fps - time.monotonic()
+            if delay > 0:
+                if self._draw_alarm is None:
+                    self._draw_alarm = self.set_alarm_in(
+                        delay, self._on_draw_alarm
+                    )
+                return
+        self._last_draw = time.monotonic()
+        super().entering_idle()
+
+    def _on_draw_alarm(self, *args):
+        # The event loop becomes idle right after, and the screen is drawn
+        self._draw_alarm = None
+
+
+class Notifier:
+    # NB: Wakes the main loop up from worker threads, and calls `callback`
+    # from the main loop (see `urwid.MainLoop.watch_pipe`). Once closed, late
+    # notifications are ignored: the file descriptor may be reused by then.
+    # The pipe does not block: when it is full, the main loop is woken up
+    # anyway.
+    def __init__(self, loop: urwid.MainLoop, callback):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._fd = loop.watch_pipe(callback)
+        os.set_blocking(self._fd, False)
+
+    def __call__(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                os.write(self._fd, b"\n")
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        with self._lock:
+            fd, self._fd = self._fd, None
+        if fd is not None:
+            self._loop.remove_watch_pipe(fd)
+            os.close(fd)
@@ -1,9 +1,13 @@
 palette = [
     ("popup", "", "black", ""),
     ("path", "light cyan", "", "bold"),
+    ("tab", "", "dark gray", ""),
+    ("tab_focus", "black", "light cyan", "bold"),
     ("folder", "light cyan", "", ""),
     ("file", "", ""),
     ("focus", "standout", "", ""),
     ("symlink", "light magenta", ""),
+    ("marked", "yellow", "", "bold"),
+    ("stale", "dark gray", ""),
     ("error", "black", "light red", "bold"),
 ]
@@ -0,0 +1,78 @@
+import itertools
+import os
+import stat
+from typing import Iterable, Optional
+
+from bfm.fs import Entry, format_size, pretty_name
+
+# NB: In-process previewers. They are way cheaper than spawning a preview
+# command, but their output is also less rich (no syntax highlighting, etc.).
+
+# ANSI colors matching the palette
+FOLDER = b"\x1b[96m"
+SYMLINK = b"\x1b[95m"
+DIM = b"\x1b[2m"
+RESET = b"\x1b[0m"
+
+# Number of bytes used to tell binary files from text files
+SNIFF_SIZE = 1024
+# Bytes commonly found in text files, besides the printable ones
+TEXT_CHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F})
+
+
+def is_binary(data: bytes) -> bool:
+    sniff = data[:SNIFF_SIZE]
+    return b"\0" in sniff or bool(sniff.translate(None, TEXT_CHARS))
+
+
+def preview_file(path: str, max_lines: int, max_bytes: int) -> Optional[bytes]:
+    # Returns None if the item cannot be previewed, e.g. if it is not a
+    # regular file (reading a FIFO could block forever).
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    try:
+        stats = os.fstat(fd)
+        if not stat.S_ISREG(stats.st_mode):
+            return None
+        data = os.read(fd, max_bytes)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+    if is_binary(data):
+        return DIM + b"binary file, " + format_size(stats.st_size).encode()
+
+    lines = data.split(b"\n", max_lines)
+    if len(lines) > max_lines:
+        del lines[max_lines:]
+    elif not lines[-1]:
+        # The data ends with a newline. NB: a truncated last line is kept,
+        # e.g. a minified file is a single line, and rows are clipped anyway.
+        lines.pop()
+    width = len(str(len(lines)))
+    return b"\n".join(
+        b"%s%*d%s %s" % (DIM, width, i, RESET, line.expandtabs(4))
+        for i, line in enumerate(lines, start=1)
+    )
+
+
+def preview_folder(entries: Iterable[Entry], max_lines: int) -> bytes:
+    # `entries` are expected to be sorted
+    lines = []
+    for entry in itertools.islice(entries, max_lines):
+        name = pretty_name(entry).encode(errors="surrogateescape")
+        if entry.is_link:
+            line = SYMLINK + name + RESET
+            # NB: not known for placeholders
+            if entry.link_target is not None:
+                target = entry.link_target.encode(errors="surrogateescape")
+                line += b" -> " + target
+        elif entry.is_dir:
+            line = FOLDER + name + RESET
+        else:
+            line = name
+        lines.append(line)
+    return b"\n".join(lines)
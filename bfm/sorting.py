@@ -0,0 +1,88 @@
+import os
+import re
+from functools import wraps
+from typing import Iterable, List
+
+from bfm.fs import Entry
+
+# Keys of the items whose metadata is not known yet (see `Entry.placeholder`),
+# listed after the others.
+UNKNOWN = float("inf")
+
+
+def cached_key(func):
+    # NB: the key of an entry is computed once per order and cached on the
+    # entry itself (entries are replaced, never modified, when an item
+    # changes). Sorting again, e.g. when switching back and forth between
+    # orders, thus only compares the keys.
+    @wraps(func)
+    def key(entry: Entry):
+        keys = entry.sort_keys
+        if keys is None:
+            keys = entry.sort_keys = {}
+        try:
+            return keys[key]
+        except KeyError:
+            value = keys[key] = func(entry)
+            return value
+
+    return key
+
+
+# NB: folders are listed first, and items with the same key by name. This key
+# is cheap enough not to be cached.
+def name_key(entry: Entry):
+    return (not entry.is_dir, entry.lower_name)
+
+
+_digits = re.compile(r"(\d+)")
+
+
+@cached_key
+def natural_key(entry: Entry):
+    # e.g. "v9" before "v10". Numbers are always at odd positions, so that
+    # they are never compared to strings.
+    parts = _digits.split(entry.lower_name)
+    parts[1::2] = map(int, parts[1::2])
+    return (not entry.is_dir, tuple(parts), entry.lower_name)
+
+
+@cached_key
+def size_key(entry: Entry):
+    # Biggest items first
+    size = UNKNOWN if entry.stat is None else -entry.stat.st_size
+    return (not entry.is_dir, size, entry.lower_name)
+
+
+@cached_key
+def mtime_key(entry: Entry):
+    # Most recently modified items first
+    mtime = UNKNOWN if entry.stat is None else -entry.stat.st_mtime_ns
+    return (not entry.is_dir, mtime, entry.lower_name)
+
+
+@cached_key
+def extension_key(entry: Entry):
+    extension = os.path.splitext(entry.lower_name)[1]
+    return (not entry.is_dir, extension, entry.lower_name)
+
+
+orders = {
+    "name": name_key,
+    "natural": natural_key,
+    "size": size_key,
+    "mtime": mtime_key,
+    "extension": extension_key,
+}
+
+
+def sort_entries(
+    entries: Iterable[Entry], key=name_key, reverse: bool = False
+) -> List[Entry]:
+    if not reverse:
+        return sorted(entries, key=key)
+    entries = sorted(entries, key=key, reverse=True)
+    # NB: folders are still listed first
+    return [e for e in entries if e.is_dir] + [
+        e for e in entries if not e.is_dir
+    ]
@@ -0,0 +1,197 @@
+import inspect
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# NB: Instrumentation is disabled by default. When disabled, an instrumented
+# function only costs an extra call and a test. It can be enabled with the
+# `:stats on` command, or by setting the BFM_TRACE environment variable to a
+# file path, in which case every timing is also appended to that file as a
+# JSON line.
+
+enabled = False
+_lock = threading.Lock()
+_timings = {}  # name -> Timing
+_counters = {}  # name -> int
+_trace = None
+
+
+class Timing:
+    # Durations are counted in buckets of powers of 2 microseconds
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        bucket = int(duration * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, p: float) -> float:
+        # Upper bound of the bucket holding the p-th percentile (at most the
+        # maximum duration)
+        threshold = p * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= threshold:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+
+def enable(trace_path: str = None):
+    global enabled, _trace
+    if trace_path and _trace is None:
+        _trace = open(trace_path, "a", buffering=1)
+    enabled = True
+
+
+def disable():
+    global enabled, _trace
+    enabled = False
+    if _trace is not None:
+        _trace.close()
+        _trace = None
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def record(name: str, duration: float, start: float = None):
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = Timing()
+        timing.add(duration)
+        if _trace is not None:
+            event = {
+                "name": name,
+                "start": start,
+                "duration": duration,
+                "thread": threading.current_thread().name,
+            }
+            _trace.write(json.dumps(event) + "\n")
+
+
+def count(name: str, n: int = 1):
+    if enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+class timer:
+    # Context manager timing a block of code
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start, self.start)
+
+
+def timed(name: str):
+    # Decorator timing each call of a function. For generator functions, the
+    # time spent iterating the generator is measured instead.
+    def decorator(f):
+        if inspect.isgeneratorfunction(f):
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not enabled:
+                    return f(*args, **kwargs)
+                return _timed_generator(name, f(*args, **kwargs))
+
+        else:
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not enabled:
+                    return f(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    record(name, time.perf_counter() - start, start)
+
+        return wrapper
+
+    return decorator
+
+
+def _timed_generator(name: str, generator):
+    duration, items = 0.0, 0
+    start = time.perf_counter()
+    try:
+        while True:
+            resumed = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                duration += time.perf_counter() - resumed
+            items += 1
+            yield item
+    finally:
+        generator.close()
+        record(name, duration, start)
+        count(name + ".items", items)
+
+
+def report() -> list:
+    # Lines summarizing the timings and counters, the most expensive first
+    lines = [
+        "{:<28}{:>8}{:>11}{:>9}{:>9}{:>9}".format(
+            "timing", "count", "total", "p50", "p90", "max"
+        )
+    ]
+    with _lock:
+        timings = sorted(_timings.items(), key=lambda item: -item[1].total)
+        counters = sorted(_counters.items())
+    for name, timing in timings:
+        lines.append(
+            "{:<28}{:>8}{:>11}{:>9}{:>9}{:>9}".format(
+                name,
+                timing.count,
+                _format_duration(timing.total),
+                _format_duration(timing.percentile(0.5)),
+                _format_duration(timing.percentile(0.9)),
+                _format_duration(timing.max),
+            )
+        )
+    if counters:
+        lines.append("")
+        lines.append("{:<28}{:>8}".format("counter", "count"))
+        for name, value in counters:
+            lines.append("{:<28}{:>8}".format(name, value))
+    return lines
+
+
+def _format_duration(duration: float) -> str:
+    if duration >= 1:
+        return "{:.2f}s".format(duration)
+    if duration >= 1e-3:
+        return "{:.1f}ms".format(duration * 1e3)
+    return "{:.0f}us".format(duration * 1e6)
+
+
+if os.environ.get("BFM_TRACE"):
+    enable(os.environ["BFM_TRACE"])
@@ -0,0 +1,45 @@
+import unittest
+
+from bfm.vendor.ansi_widget import ANSIWidget, ansi_truncate_and_fill
+
+
+class TestAnsiTruncateAndFill(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(ansi_truncate_and_fill(b"abc", 5), b"abc  ")
+        self.assertEqual(ansi_truncate_and_fill(b"abcdef", 3), b"abc")
+
+    def test_escape_codes(self):
+        line = b"\x1b[31mred\x1b[0m text"
+        self.assertEqual(
+            ansi_truncate_and_fill(line, 5), b"\x1b[31mred\x1b[0m t"
+        )
+        self.assertEqual(
+            ansi_truncate_and_fill(line, 10), b"\x1b[31mred\x1b[0m text  "
+        )
+
+
+class TestANSIWidget(unittest.TestCase):
+    def test_append(self):
+        w = ANSIWidget()
+        w.append(b"first\r\nsec")
+        w.append(b"ond\nthi")
+        self.assertEqual(w.lines, [b"first", b"second"])
+        self.assertEqual(w.text, b"first\nsecond\nthi")
+
+    def test_max_lines(self):
+        w = ANSIWidget(max_lines=2)
+        self.assertTrue(w.append(b"1\n"))
+        self.assertFalse(w.append(b"2\n3\n4"))
+        self.assertFalse(w.append(b"5\n"))
+        self.assertEqual(w.text, b"1\n2\n")
+
+    def render(self, w: ANSIWidget, cols: int, rows: int):
+        canvas = w.render((cols, rows))
+        return [row[0][2] for row in canvas.content(cols=cols, rows=rows)]
+
+    def test_render(self):
+        w = ANSIWidget(b"abc\nde")
+        self.assertEqual(self.render(w, 4, 3), [b"abc ", b"de  ", b"    "])
+        # Rows that may have changed are rendered again
+        w.append(b"f\nghi")
+        self.assertEqual(self.render(w, 4, 3), [b"abc ", b"def ", b"ghi "])
@@ -0,0 +1,54 @@
+import time
+import unittest
+
+from bfm.cache import LRUCache, memoize
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_weight(self):
+        cache = LRUCache(10, weigh=len)
+        cache.put("a", "x" * 6)
+        cache.put("b", "x" * 3)
+        self.assertEqual(cache.weight, 9)
+        cache.put("c", "x" * 4)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.weight, 7)
+        # Too big to fit
+        cache.put("d", "x" * 11)
+        self.assertNotIn("d", cache)
+        self.assertEqual(cache.weight, 7)
+
+    def test_pop(self):
+        cache = LRUCache(10, weigh=len)
+        cache.put("a", "xyz")
+        self.assertEqual(cache.pop("a"), "xyz")
+        self.assertIsNone(cache.pop("a"))
+        self.assertEqual(cache.weight, 0)
+
+
+class TestMemoize(unittest.TestCase):
+    def test_ttl(self):
+        calls = []
+
+        @memoize(ttl=0.05)
+        def f(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(f(1), 2)
+        self.assertEqual(f(1), 2)
+        self.assertEqual(f(2), 4)
+        self.assertEqual(calls, [1, 2])
+        time.sleep(0.05)
+        f(1)
+        self.assertEqual(calls, [1, 2, 1])
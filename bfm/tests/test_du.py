@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bfm import du
+from bfm.du import DiskUsageCache, disk_usage
+
+
+class TestDiskUsage(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmpdir.name, "root")
+        os.makedirs(os.path.join(self.root, "a", "b"))
+        os.makedirs(os.path.join(self.root, "c"))
+        for name in ["file", "a/file", "a/b/file"]:
+            with open(os.path.join(self.root, name), "wb") as f:
+                f.write(b"x" * 10000)
+        self.cache = DiskUsageCache(
+            os.path.join(self._tmpdir.name, "cache", "du.sqlite3")
+        )
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def du(self, path):
+        with mock.patch.object(du, "_scan", wraps=du._scan) as scan:
+            size = disk_usage(path, self.cache)
+        return size, scan.call_count
+
+    def test_cache(self):
+        size, scans = self.du(self.root)
+        self.assertEqual(scans, 4)
+        self.assertGreaterEqual(size, 30000)
+
+        # Nothing changed
+        self.assertEqual(self.du(self.root), (size, 0))
+
+        # Only the folder that changed is scanned again
+        os.remove(os.path.join(self.root, "a", "b", "file"))
+        new_size, scans = self.du(self.root)
+        self.assertEqual(scans, 1)
+        self.assertLess(new_size, size)
+
+    def test_locked_cache(self):
+        # e.g. another worker is writing: sizes are still computed
+        import sqlite3
+
+        expected = disk_usage(self.root)
+        self.cache.put((b"", 0, 0, 0), 0, [])
+        self.cache.commit()
+        other = sqlite3.connect(self.cache.path)
+        other.execute("BEGIN IMMEDIATE")
+        try:
+            cache = DiskUsageCache(self.cache.path, timeout=0.01)
+            cache.commit_rows = 1
+            self.assertEqual(disk_usage(self.root, cache), expected)
+        finally:
+            other.rollback()
+            other.close()
+
+    def test_cancelled(self):
+        self.assertIsNone(disk_usage(self.root, cancelled=lambda: True))
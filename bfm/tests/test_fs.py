@@ -0,0 +1,268 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from bfm.fs import (
+    Entry,
+    Hydrator,
+    Scanner,
+    SharedScanner,
+    TreeNavigationMixin,
+    format_size,
+    long_metadata,
+    pretty_name,
+)
+
+
+class TestEntry(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        os.mkdir(os.path.join(self.root, "folder"))
+        with open(os.path.join(self.root, "file"), "w") as f:
+            f.write("content")
+        script = os.path.join(self.root, "script")
+        with open(script, "w"):
+            pass
+        os.chmod(script, 0o755)
+        os.symlink("folder", os.path.join(self.root, "link"))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def scan(self):
+        entries = TreeNavigationMixin.scanpath(None, self.root)
+        return {entry.name: entry for entry in entries}
+
+    def test_scanpath(self):
+        entries = self.scan()
+        self.assertEqual(set(entries), {"folder", "file", "script", "link"})
+        self.assertEqual(entries["file"].stat.st_size, 7)
+
+    def test_pretty_name(self):
+        entries = self.scan()
+        self.assertEqual(pretty_name(entries["folder"]), "folder/")
+        self.assertEqual(pretty_name(entries["file"]), "file")
+        self.assertEqual(pretty_name(entries["script"]), "script*")
+        self.assertEqual(pretty_name(entries["link"]), "link/")
+
+    def test_symlink(self):
+        entry = self.scan()["link"]
+        self.assertTrue(entry.is_link)
+        self.assertTrue(entry.is_dir)
+        self.assertEqual(entry.link_target, "folder")
+
+    def test_long_metadata(self):
+        os.chmod(os.path.join(self.root, "file"), 0o644)
+        mode, _, _, size, *_ = long_metadata(self.scan()["file"]).split()
+        self.assertEqual(mode, "-rw-r--r--")
+        self.assertEqual(size, "7B")
+
+    def test_placeholder(self):
+        with os.scandir(self.root) as it:
+            entries = {e.name: Entry.placeholder(e) for e in it}
+        self.assertTrue(entries["folder"].is_dir)
+        self.assertFalse(entries["file"].hydrated)
+        self.assertEqual(long_metadata(entries["file"]), "...")
+        self.assertEqual(long_metadata(entries["file"].as_stale()), "?")
+        # The target of a symlink is not known yet
+        self.assertTrue(entries["link"].is_link)
+        self.assertIsNone(entries["link"].link_target)
+
+    def test_from_path(self):
+        for name, entry in self.scan().items():
+            other = Entry.from_path(entry.path)
+            for attr in Entry.__slots__:
+                self.assertEqual(getattr(other, attr), getattr(entry, attr))
+
+
+class TestFormat(unittest.TestCase):
+    def test_format_size(self):
+        self.assertEqual(format_size(0), "0B")
+        self.assertEqual(format_size(1023), "1023B")
+        self.assertEqual(format_size(1024), "1.0K")
+        self.assertEqual(format_size(1536 * 1024), "1.5M")
+
+
+class TestImports(unittest.TestCase):
+    def test_lazy_imports(self):
+        # Startup time: these are only imported when needed
+        modules = ["grp", "humanize", "pwd", "send2trash", "sqlite3"]
+        code = "import sys, bfm.widgets; print(*sorted(sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertFalse(set(modules) & set(output.decode().split()))
+
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        for i in range(10):
+            with open(os.path.join(self.root, str(i)), "w"):
+                pass
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_batches(self):
+        scanner = Scanner(self.root, batch_size=3)
+        scanner.run()
+        batches = list(scanner.drain())
+        self.assertTrue(scanner.done)
+        self.assertIsNone(scanner.error)
+        self.assertEqual(scanner.count, 10)
+        self.assertEqual(len(batches[0]), 3)
+        self.assertEqual(sum(map(len, batches)), 10)
+
+    def test_cancel(self):
+        scanner = Scanner(self.root)
+        scanner.cancel()
+        scanner.run()
+        self.assertEqual(list(scanner.drain()), [])
+        self.assertFalse(scanner.done)
+
+    def test_error(self):
+        scanner = Scanner(os.path.join(self.root, "missing"))
+        scanner.run()
+        list(scanner.drain())
+        self.assertTrue(scanner.done)
+        self.assertIsInstance(scanner.error, FileNotFoundError)
+
+
+class TestSharedScanner(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        for i in range(10):
+            with open(os.path.join(self.root, str(i)), "w"):
+                pass
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def drain(self, handle):
+        entries = []
+        deadline = time.monotonic() + 5
+        while not handle.done and time.monotonic() < deadline:
+            entries.extend(e for batch in handle.drain() for e in batch)
+            time.sleep(0.01)
+        return entries
+
+    def test_shared(self):
+        scans = SharedScanner(batch_size=3)
+        with mock.patch.object(Scanner, "start") as start:
+            first = scans.scan(self.root, lambda: None)
+            second = scans.scan(self.root, lambda: None)
+        # A single scan, run here
+        self.assertEqual(start.call_count, 1)
+        first._scan[0].run()
+        self.assertEqual(len(self.drain(first)), 10)
+        # Joining late, the batches drained so far are still handed over
+        self.assertEqual(len(self.drain(second)), 10)
+        self.assertEqual(second.count, 10)
+        self.assertIsNotNone(second.stamp)
+
+        # Once over, the directory is scanned again
+        with mock.patch.object(Scanner, "start") as start:
+            scans.scan(self.root, lambda: None)
+        self.assertEqual(start.call_count, 1)
+
+    def test_cancel(self):
+        scans = SharedScanner()
+        with mock.patch.object(Scanner, "start"):
+            first = scans.scan(self.root, lambda: None)
+            second = scans.scan(self.root, lambda: None)
+        scanner = first._scan[0]
+        first.cancel()
+        self.assertFalse(scanner.cancelled)
+        second.cancel()
+        self.assertTrue(scanner.cancelled)
+
+
+class TestHydrator(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        self.paths = [os.path.join(self.root, str(i)) for i in range(100)]
+        for path in self.paths:
+            with open(path, "w"):
+                pass
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def wait(self, hydrator, count):
+        results = {}
+        deadline = time.monotonic() + 5
+        while len(results) < count and time.monotonic() < deadline:
+            results.update(hydrator.drain())
+            time.sleep(0.01)
+        return results
+
+    def test_hydrate(self):
+        hydrator = Hydrator()
+        missing = os.path.join(self.root, "missing")
+        hydrator.submit(self.paths + [missing])
+        # Submitted twice, handled once
+        hydrator.submit(self.paths[:10], first=True)
+        results = self.wait(hydrator, 101)
+        self.assertEqual(len(results), 101)
+        self.assertTrue(results[self.paths[0]].hydrated)
+        self.assertIsInstance(results[missing], FileNotFoundError)
+        self.assertTrue(hydrator.idle)
+
+    def test_clear(self):
+        hydrator = Hydrator(workers=0)
+        hydrator.submit(self.paths)
+        hydrator.clear(lambda path: path == self.paths[0])
+        self.assertEqual(list(hydrator._pending), self.paths[:1])
+        self.assertFalse(hydrator.idle)
+        hydrator.clear()
+        self.assertTrue(hydrator.idle)
+
+    def test_expire(self):
+        os.mkdir(os.path.join(self.root, "hung"))
+        hung = [os.path.join(self.root, "hung", str(i)) for i in range(20)]
+        slow = hung[0]
+        release = threading.Event()
+        from_path = Entry.from_path
+
+        def hang(path):
+            if path == slow:
+                release.wait()
+            return from_path(path)
+
+        hydrator = Hydrator(workers=2, timeout=0.05, chunk_size=10)
+        with mock.patch.object(Entry, "from_path", side_effect=hang):
+            hydrator.submit(hung + self.paths)
+            time.sleep(0.1)
+            # The other items of its folder are given up on
+            self.assertEqual(sorted(hydrator.expire()), sorted(hung))
+            self.assertEqual(hydrator.expire(), [])
+            # The others are handled by another worker
+            results = self.wait(hydrator, 100)
+            self.assertEqual(set(results), set(self.paths))
+            self.assertTrue(hydrator.idle)
+            # Late results are reported too
+            release.set()
+            self.assertIn(slow, self.wait(hydrator, 1))
+
+    def test_max_stuck(self):
+        release = threading.Event()
+        hydrator = Hydrator(workers=1, timeout=0.05, max_stuck=1)
+        with mock.patch.object(
+            Entry, "from_path", side_effect=lambda path: release.wait()
+        ):
+            hydrator.submit(self.paths[:1])
+            time.sleep(0.1)
+            self.assertEqual(hydrator.expire(), self.paths[:1])
+            # No worker is started anymore
+            hydrator.submit(self.paths[1:])
+            self.assertEqual(sorted(hydrator.expire()), sorted(self.paths[1:]))
+            self.assertTrue(hydrator.idle)
+            release.set()
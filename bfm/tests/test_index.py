@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bfm import index
+from bfm.index import FileIndex, FuzzySearch
+
+
+class TestFileIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmpdir.name, "root")
+        os.makedirs(os.path.join(self.root, "a", "b"))
+        for name in ["file", "a/file", "a/b/file"]:
+            open(os.path.join(self.root, name), "w").close()
+        self.index = FileIndex(
+            os.path.join(self._tmpdir.name, "cache", "index.sqlite3")
+        )
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def update(self):
+        with mock.patch.object(index, "_scan", wraps=index._scan) as scan:
+            paths = self.index.update(self.root)
+        return sorted(paths), scan.call_count
+
+    def test_update(self):
+        paths, scans = self.update()
+        self.assertEqual(paths, ["a/", "a/b/", "a/b/file", "a/file", "file"])
+        self.assertEqual(scans, 3)
+
+        # Nothing changed
+        self.assertEqual(self.update(), (paths, 0))
+
+        # Only the folder that changed is scanned again
+        os.remove(os.path.join(self.root, "a", "b", "file"))
+        paths, scans = self.update()
+        self.assertEqual(paths, ["a/", "a/b/", "a/file", "file"])
+        self.assertEqual(scans, 1)
+
+    def test_load(self):
+        self.assertEqual(self.index.load(self.root), [])
+        paths, _ = self.update()
+        self.assertEqual(sorted(self.index.load(self.root)), paths)
+
+    def test_cancelled(self):
+        # The folders indexed before the update was cancelled are kept
+        calls = []
+
+        def cancelled():
+            calls.append(None)
+            return len(calls) > 2
+
+        self.assertIsNone(self.index.update(self.root, cancelled))
+        self.assertEqual(
+            sorted(self.index.load(self.root)),
+            ["a/", "a/b/", "a/file", "file"],
+        )
+        # ... and not scanned again
+        self.assertEqual(self.update()[1], 1)
+
+
+class TestFuzzySearch(unittest.TestCase):
+    def setUp(self):
+        self.paths = ["src/", "src/main.py", "docs/index.md", "README"]
+        self.search = FuzzySearch(self.paths)
+
+    def matches(self, query, max_matches=100, candidates=None):
+        matches = []
+        for batch in self.search.search(query, max_matches, candidates):
+            matches.extend(batch)
+        return [self.paths[i] for i in matches]
+
+    def test_search(self):
+        self.assertEqual(self.matches("smp"), ["src/main.py"])
+        self.assertEqual(self.matches("DOC"), ["docs/index.md"])
+        self.assertEqual(self.matches("s", max_matches=2), self.paths[:2])
+        self.assertEqual(self.matches("xyz"), [])
+
+    def test_refine(self):
+        self.assertEqual(self.matches("smp", candidates=[2, 3]), [])
+        self.assertEqual(
+            self.matches("d", candidates=[1, 2]), ["docs/index.md"]
+        )
+
+    def test_rank(self):
+        matches = [0, 1, 2, 3]
+        ranked = self.search.rank("i", matches, 2)
+        self.assertEqual(
+            [self.paths[i] for i in ranked], ["src/main.py", "docs/index.md"]
+        )
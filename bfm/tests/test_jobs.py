@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bfm import jobs
+from bfm.jobs import BatchJob, TransferJob, copy_file
+
+
+class TestTransferJob(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        os.makedirs(self.path("src", "folder"))
+        with open(self.path("src", "folder", "file"), "wb") as f:
+            f.write(os.urandom(100000))
+        os.symlink("file", self.path("src", "folder", "link"))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.root, *names)
+
+    def read(self, *names):
+        with open(self.path(*names), "rb") as f:
+            return f.read()
+
+    def test_copy(self):
+        src, dst = self.path("src"), self.path("dst", "copy")
+        job = TransferJob({src: dst})
+        job.run()
+        self.assertEqual(job.results, [(src, dst)])
+        self.assertEqual(job.bytes_done, job.total_bytes)
+        self.assertEqual(
+            self.read("dst", "copy", "folder", "file"),
+            self.read("src", "folder", "file"),
+        )
+        self.assertEqual(os.readlink(self.path(dst, "folder", "link")), "file")
+
+        # Existing items are not overwritten
+        job = TransferJob({src: dst})
+        job.run()
+        self.assertIsInstance(job.errors[0][1], FileExistsError)
+
+    def test_copy_into_itself(self):
+        src = self.path("src")
+        job = TransferJob({src: self.path("src", "folder", "copy")})
+        job.run()
+        self.assertEqual(job.errors[0][1].errno, jobs.errno.EINVAL)
+        self.assertFalse(os.path.exists(self.path("src", "folder", "copy")))
+
+    def test_copy_fifo(self):
+        os.mkfifo(self.path("src", "folder", "fifo"))
+        job = TransferJob({self.path("src"): self.path("copy")})
+        job.run()
+        self.assertEqual(job.errors, [])
+        fifo = os.lstat(self.path("copy", "folder", "fifo"))
+        self.assertTrue(jobs.stat.S_ISFIFO(fifo.st_mode))
+
+    def test_move(self):
+        src, dst = self.path("src"), self.path("dst")
+        content = self.read("src", "folder", "file")
+        job = TransferJob({src: dst}, move=True)
+        job.run()
+        self.assertFalse(os.path.exists(src))
+        self.assertEqual(self.read("dst", "folder", "file"), content)
+
+    def test_fallback(self):
+        # Each method continues where the previous one stopped
+        src, dst = self.path("src", "folder", "file"), self.path("copy")
+        calls = []
+
+        def copy_file_range(infd, outfd, count):
+            if calls:
+                raise OSError(jobs.errno.EXDEV, "")
+            calls.append(count)
+            return os.write(outfd, os.read(infd, 1000))
+
+        with mock.patch.object(jobs, "CHUNK_SIZE", 4096), mock.patch.object(
+            jobs.os, "copy_file_range", copy_file_range, create=True
+        ), mock.patch.object(
+            jobs.os, "sendfile", side_effect=OSError(jobs.errno.EINVAL, "")
+        ):
+            copy_file(src, dst)
+        self.assertEqual(self.read("copy"), self.read("src", "folder", "file"))
+
+    def test_cancel(self):
+        job = BatchJob(
+            "Remove", os.remove, [self.path("src", "folder", "file")]
+        )
+        job.cancel()
+        job.run()
+        self.assertTrue(job.done)
+        self.assertEqual(job.count, 0)
@@ -1,7 +1,20 @@
 import unittest
 from string import ascii_letters
+from unittest import mock
 
-from bfm.keys import escape
+import urwid
+
+from bfm.keys import (
+    MAX_COUNT,
+    MAX_REPEAT,
+    CallableCommandsMixin,
+    ExtendedCommandMap,
+    all_commands,
+    escape,
+    input_state,
+    repeatable,
+    split_keys,
+)
 
 
 class TestEscape(unittest.TestCase):
@@ -25,3 +38,71 @@ class TestEscape(unittest.TestCase):
         }
         for k, v in escapes.items():
             self.assertEqual(escape(k), v)
+
+
+class TestSplitKeys(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(split_keys("gg"), ["g", "g"])
+        self.assertEqual(split_keys(r"g<down>\<"), ["g", "<down>", r"\<"])
+
+
+class TestCommandMap(unittest.TestCase):
+    def setUp(self):
+        self.command_map = ExtendedCommandMap(
+            {"gg": "top", "G": "bottom"}, aliases={"<home>": "gg"}
+        )
+
+    def tearDown(self):
+        input_state.clear()
+
+    def test_lookup(self):
+        self.assertEqual(self.command_map["G"], "bottom")
+        self.assertEqual(self.command_map["home"], "top")
+        self.assertIsNone(self.command_map["g"])
+        input_state.keys = ["g"]
+        self.assertEqual(self.command_map["g"], "top")
+        self.assertIsNone(self.command_map["G"])
+
+    def test_prefixes(self):
+        self.assertIn("g", all_commands.children)
+        self.assertIsNotNone(all_commands.find(["g", "g"]).command)
+
+
+class TestCount(unittest.TestCase):
+    class Widget(CallableCommandsMixin, urwid.Widget):
+        _command_map = ExtendedCommandMap(
+            {
+                "J": lambda self, count=1: self.calls.append(count),
+                "K": lambda self: self.calls.append(None),
+                "H": repeatable(lambda self: self.calls.append("H")),
+            }
+        )
+
+        def __init__(self):
+            self.calls = []
+
+        def keypress(self, size, key):
+            return super().keypress(size, key)
+
+    def tearDown(self):
+        input_state.clear()
+
+    def test_count(self):
+        w = self.Widget()
+        w.keypress((1,), "J")
+        input_state.count = 20
+        # Applied at once by commands accepting a count, repeated by
+        # repeatable ones, ignored otherwise
+        w.keypress((1,), "J")
+        w.keypress((1,), "K")
+        w.keypress((1,), "H")
+        self.assertEqual(w.calls, [1, 20, None] + ["H"] * 20)
+
+    def test_max_count(self):
+        w = self.Widget()
+        with mock.patch.object(input_state, "_reset_timeout"):
+            for digit in "99999":
+                input_state.push_digit(digit)
+        self.assertEqual(input_state.count, MAX_COUNT)
+        w.keypress((1,), "H")
+        self.assertEqual(w.calls, ["H"] * MAX_REPEAT)
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from bfm.listing import main, walk
+
+
+class TestListing(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        os.makedirs(os.path.join(self.root, "dir", "sub"))
+        for name, size in [("b.txt", 1), ("A.log", 3), ("dir/c.txt", 2)]:
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write("x" * size)
+        os.symlink("dir", os.path.join(self.root, "link"))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def names(self, **kwargs):
+        return [
+            os.path.relpath(e.path, self.root)
+            for e in walk(self.root, **kwargs)
+        ]
+
+    def run_main(self, *args):
+        out = io.TextIOWrapper(io.BytesIO())
+        with mock.patch("sys.stdout", out):
+            code = main(list(args) + [self.root])
+        return code, out.buffer.getvalue().decode().splitlines()
+
+    def test_walk(self):
+        self.assertEqual(self.names(), ["dir", "link", "A.log", "b.txt"])
+        self.assertEqual(
+            self.names(order="size"), ["dir", "link", "A.log", "b.txt"]
+        )
+        self.assertEqual(
+            self.names(reverse=True), ["link", "dir", "b.txt", "A.log"]
+        )
+        # NB: symlinks are not followed
+        self.assertEqual(
+            self.names(depth=3),
+            ["dir", "dir/sub", "dir/c.txt", "link", "A.log", "b.txt"],
+        )
+        self.assertEqual(
+            self.names(text="txt", depth=2), ["dir/c.txt", "b.txt"]
+        )
+        self.assertEqual(sorted(self.names(order=None)), sorted(self.names()))
+
+    def test_formats(self):
+        code, lines = self.run_main("--sort", "size", "--filter", "A")
+        self.assertEqual(code, 0)
+        items = [json.loads(line) for line in lines]
+        self.assertEqual([i["name"] for i in items], ["A.log"])
+        self.assertEqual(items[0]["type"], "file")
+        self.assertEqual(items[0]["size"], 3)
+
+        code, lines = self.run_main("--format", "tsv")
+        fields = lines[1].split("\t")
+        self.assertEqual(fields[1:4], ["link", "link", "/"])
+        self.assertEqual(fields[-1], "dir")
+
+    def test_undecodable_name(self):
+        open(os.path.join(os.fsencode(self.root), b"\xff"), "w").close()
+        code, lines = self.run_main("--filter", "\udcff")
+        self.assertEqual(os.fsencode(json.loads(lines[0])["name"]), b"\xff")
+
+    def test_no_urwid(self):
+        code = "import sys, bfm.listing; print('urwid' in sys.modules)"
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(output.strip(), b"False")
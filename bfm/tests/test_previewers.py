@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from bfm.fs import scanpath
+from bfm.previewers import (
+    DIM,
+    FOLDER,
+    RESET,
+    SYMLINK,
+    is_binary,
+    preview_file,
+    preview_folder,
+)
+
+
+class TestPreviewers(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def write(self, name: str, data: bytes):
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_is_binary(self):
+        self.assertFalse(is_binary("héllo\tworld\n".encode()))
+        self.assertTrue(is_binary(b"\x7fELF\x02\x01\x01\x00"))
+
+    def test_preview_file(self):
+        path = self.write("file", b"a\tb\nc\nd\n")
+        self.assertEqual(
+            preview_file(path, max_lines=2, max_bytes=1024),
+            DIM + b"1" + RESET + b" a   b\n" + DIM + b"2" + RESET + b" c",
+        )
+        # The truncated last line is kept
+        self.assertEqual(
+            preview_file(path, max_lines=10, max_bytes=5),
+            DIM + b"1" + RESET + b" a   b\n" + DIM + b"2" + RESET + b" c",
+        )
+
+    def test_preview_long_line(self):
+        # e.g. minified JSON
+        path = self.write("file", b"{" + b"x" * 2000 + b"}")
+        self.assertEqual(
+            preview_file(path, max_lines=10, max_bytes=1024),
+            DIM + b"1" + RESET + b" {" + b"x" * 1023,
+        )
+
+    def test_preview_binary_file(self):
+        path = self.write("file", b"\0" * 10)
+        self.assertIn(b"binary", preview_file(path, 10, 1024))
+
+    def test_preview_fifo(self):
+        path = os.path.join(self.root, "fifo")
+        os.mkfifo(path)
+        self.assertIsNone(preview_file(path, 10, 1024))
+
+    def test_preview_folder(self):
+        os.mkdir(os.path.join(self.root, "folder"))
+        self.write("file", b"")
+        entries = sorted(scanpath(self.root), key=lambda e: e.name)
+        self.assertEqual(
+            preview_folder(entries, 10), b"file\n" + FOLDER + b"folder/" + RESET
+        )
+        self.assertEqual(preview_folder(entries, 1), b"file")
+
+    def test_preview_folder_placeholders(self):
+        os.symlink("target", os.path.join(self.root, "link"))
+        self.assertEqual(
+            preview_folder(scanpath(self.root, hydrate=False), 10),
+            SYMLINK + b"link" + RESET,
+        )
@@ -0,0 +1,53 @@
+import os
+import unittest
+
+from bfm.fs import Entry
+from bfm.sorting import mtime_key, natural_key, orders, sort_entries
+
+
+def entry(name: str, is_dir: bool = False, size: int = None, mtime: int = 0):
+    stat_result = None
+    if size is not None:
+        stat_result = os.stat_result(
+            (0o100644, 0, 0, 1, 0, 0, size, 0, mtime, 0),
+            {"st_mtime_ns": mtime * 10**9},
+        )
+    return Entry("/" + name, is_dir, False, stat_result)
+
+
+class TestSorting(unittest.TestCase):
+    def names(self, entries):
+        return [e.name for e in entries]
+
+    def test_orders(self):
+        entries = [
+            entry("v10.txt", size=1, mtime=3),
+            entry("v9.log", size=3, mtime=1),
+            entry("v1", is_dir=True, size=0, mtime=2),
+            entry("new.txt"),
+        ]
+        expected = {
+            "name": ["v1", "new.txt", "v10.txt", "v9.log"],
+            "natural": ["v1", "new.txt", "v9.log", "v10.txt"],
+            "size": ["v1", "v9.log", "v10.txt", "new.txt"],
+            "mtime": ["v1", "v10.txt", "v9.log", "new.txt"],
+            "extension": ["v1", "v9.log", "new.txt", "v10.txt"],
+        }
+        for order, names in expected.items():
+            self.assertEqual(
+                self.names(sort_entries(entries, orders[order])), names
+            )
+        # Folders are still listed first
+        self.assertEqual(
+            self.names(sort_entries(entries, natural_key, reverse=True)),
+            ["v1", "v10.txt", "v9.log", "new.txt"],
+        )
+
+    def test_cached_key(self):
+        e = entry("a", size=1, mtime=1)
+        key = mtime_key(e)
+        self.assertIs(mtime_key(e), key)
+        # Each order has its own key
+        natural = natural_key(e)
+        self.assertIs(mtime_key(e), key)
+        self.assertIs(natural_key(e), natural)
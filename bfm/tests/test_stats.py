@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from bfm import stats
+
+
+@stats.timed("function")
+def function(x):
+    return x * 2
+
+
+@stats.timed("generator")
+def generator(n):
+    yield from range(n)
+
+
+class TestStats(unittest.TestCase):
+    def tearDown(self):
+        stats.disable()
+        stats.reset()
+
+    def test_disabled(self):
+        self.assertEqual(function(2), 4)
+        self.assertEqual(list(generator(3)), [0, 1, 2])
+        with stats.timer("block"):
+            pass
+        stats.count("counter")
+        self.assertEqual(stats._timings, {})
+        self.assertEqual(stats._counters, {})
+
+    def test_enabled(self):
+        stats.enable()
+        function(1)
+        function(2)
+        self.assertEqual(list(generator(3)), [0, 1, 2])
+        with stats.timer("block"):
+            pass
+        self.assertEqual(stats._timings["function"].count, 2)
+        self.assertEqual(stats._timings["generator"].count, 1)
+        self.assertEqual(stats._counters["generator.items"], 3)
+        self.assertIn("block", stats._timings)
+        report = "\n".join(stats.report())
+        self.assertIn("function", report)
+
+    def test_trace(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace")
+            stats.enable(path)
+            function(1)
+            stats.disable()
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual([event["name"] for event in events], ["function"])
+
+    def test_percentile(self):
+        timing = stats.Timing()
+        for duration in [0.001] * 9 + [1]:
+            timing.add(duration)
+        self.assertLess(timing.percentile(0.5), 0.002)
+        self.assertGreaterEqual(timing.percentile(1), 1)
+
+    def test_instrumented(self):
+        # Stat calls (now made by the metadata workers) and sorts are timed
+        from bfm.fs import Hydrator
+        from bfm.widgets.fs import FolderWidget
+
+        stats.enable()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            w_folder = FolderWidget(background=False)
+            w_folder.change_path(tmpdir)
+            w_folder.set_sort_order("size")
+            hydrator = Hydrator()
+            hydrator.submit([tmpdir])
+            deadline = time.monotonic() + 5
+            while not list(hydrator.drain()) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        for name in ["stat", "sort", "resort"]:
+            self.assertIn(name, stats._timings)
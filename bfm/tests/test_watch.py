@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import unittest
+
+from bfm.watch import InotifyWatcher, PollingWatcher, SharedWatcher
+
+
+class WatcherTestMixin:
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        self.watcher = self.create_watcher()
+        self.watcher.watch(self.root)
+
+    def tearDown(self):
+        self.watcher.close()
+        self._tmpdir.cleanup()
+
+    def touch(self, name: str):
+        with open(os.path.join(self.root, name), "w"):
+            pass
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.watcher.read(), {})
+
+    def test_unwatch(self):
+        self.watcher.unwatch(self.root)
+        self.touch("file")
+        self.assertEqual(self.watcher.read(), {})
+
+
+class TestInotifyWatcher(WatcherTestMixin, unittest.TestCase):
+    def create_watcher(self):
+        try:
+            return InotifyWatcher()
+        except (AttributeError, OSError):
+            self.skipTest("inotify is not available")
+
+    def test_changes(self):
+        self.touch("a")
+        self.touch("b")
+        os.remove(os.path.join(self.root, "a"))
+        self.assertEqual(self.watcher.read(), {self.root: {"a", "b"}})
+
+    def test_delete_self(self):
+        os.rmdir(self.root)
+        os.mkdir(self.root)
+        self.assertEqual(self.watcher.read(), {self.root: None})
+        # The re-created directory can be watched
+        self.watcher.watch(self.root)
+        self.touch("a")
+        self.assertEqual(self.watcher.read(), {self.root: {"a"}})
+
+    def test_rewatch(self):
+        calls = []
+        watcher = SharedWatcher(self.watcher)
+        watcher.watch(self.root, lambda path, names: calls.append(names))
+        os.rmdir(self.root)
+        os.mkdir(self.root)
+        watcher.dispatch()
+        self.touch("a")
+        watcher.dispatch()
+        self.assertEqual(calls, [None, {"a"}])
+
+
+class TestPollingWatcher(WatcherTestMixin, unittest.TestCase):
+    def create_watcher(self):
+        return PollingWatcher()
+
+    def test_changes(self):
+        # Make sure the mtime changes, whatever its granularity
+        stats = os.stat(self.root)
+        os.utime(self.root, ns=(stats.st_atime_ns, stats.st_mtime_ns - 10**9))
+        self.watcher.watch(self.root)
+        time.sleep(0.01)
+        self.touch("a")
+        self.assertEqual(self.watcher.read(), {self.root: None})
+        self.assertEqual(self.watcher.read(), {})
+
+
+class TestSharedWatcher(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        self.watcher = SharedWatcher(PollingWatcher())
+        self.calls = []
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def listener(self, path, names):
+        self.calls.append((path, names))
+
+    def test_dispatch(self):
+        other = []
+        self.watcher.watch(self.root, self.listener)
+        self.watcher.watch(self.root, lambda *args: other.append(args))
+        # Watched once
+        self.assertEqual(list(self.watcher.watcher._stamps), [self.root])
+
+        self.watcher.watcher._stamps[self.root] = None
+        self.watcher.dispatch()
+        self.assertEqual(self.calls, [(self.root, None)])
+        self.assertEqual(other, [(self.root, None)])
+
+    def test_unwatch(self):
+        self.watcher.watch(self.root, self.listener)
+        self.watcher.watch(self.root, print)
+        self.watcher.unwatch(self.root, self.listener)
+        self.assertIn(self.root, self.watcher.watcher._stamps)
+        self.watcher.unwatch(self.root, print)
+        self.assertNotIn(self.root, self.watcher.watcher._stamps)
@@ -0,0 +1,180 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bfm.fs import Entry
+from bfm.jobs import BatchJob
+from bfm.main_loop import Notifier
+from bfm.widgets.fs import FolderWidget
+
+
+class TestFolderWidget(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = self._tmpdir.name
+        for name in ["b", "A", "c"]:
+            self.touch(name)
+        os.mkdir(os.path.join(self.root, "z"))
+
+        self.w_folder = FolderWidget(background=False)
+        self.w_folder.change_path(self.root)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def touch(self, name: str):
+        with open(os.path.join(self.root, name), "w"):
+            pass
+
+    def names(self):
+        return [entry.name for entry in self.w_folder.body.entries]
+
+    def test_sorting(self):
+        self.assertEqual(self.names(), ["z", "A", "b", "c"])
+
+    def test_sort_orders(self):
+        for i, name in enumerate(["b", "A", "c"]):
+            path = os.path.join(self.root, name)
+            os.utime(path, (0, 10 * i))
+        self.w_folder.refresh()
+        self.w_folder.render((80, 10), focus=True)
+        widgets = dict(self.w_folder.body._widgets)
+
+        # NB: switching orders does not hit the filesystem
+        with mock.patch("os.stat", side_effect=AssertionError):
+            self.w_folder.set_sort_order("mtime")
+            self.assertEqual(self.names(), ["z", "c", "A", "b"])
+            self.w_folder.toggle_sort_reverse()
+            self.assertEqual(self.names(), ["z", "b", "A", "c"])
+            self.w_folder.set_sort_order("name")
+            self.assertEqual(self.names(), ["z", "c", "b", "A"])
+        # The item widgets are kept
+        for path, w in self.w_folder.body._widgets.items():
+            self.assertIs(w, widgets[path])
+
+    def test_refresh(self):
+        entries = self.w_folder.body.entries
+        self.w_folder.refresh()
+        # Nothing changed, the very same entries are kept
+        self.assertIs(self.w_folder.body.entries, entries)
+
+        os.remove(os.path.join(self.root, "b"))
+        self.touch("B2")
+        self.w_folder.refresh()
+        self.assertEqual(self.names(), ["z", "A", "B2", "c"])
+
+    def test_focus_item_by_path(self):
+        self.w_folder.focus_item_by_path(os.path.join(self.root, "b"))
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "b")
+
+        # The focused item stays focused across refreshes
+        self.touch("a0")
+        self.w_folder.refresh()
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "b")
+
+    def test_lazy_widgets(self):
+        for i in range(1000):
+            self.touch("file{}".format(i))
+        self.w_folder.refresh()
+        self.w_folder.render((80, 10), focus=True)
+        self.assertLess(len(self.w_folder.body._widgets), 20)
+
+        self.w_folder.body.set_focus(999)
+        self.w_folder.render((80, 10), focus=True)
+        self.assertLess(len(self.w_folder.body._widgets), 40)
+
+    def test_apply_changes(self):
+        self.touch("a0")
+        os.remove(os.path.join(self.root, "b"))
+        path = os.path.join(self.root, "a0")
+        self.w_folder.apply_changes(
+            {path: Entry.from_path(path)}, {os.path.join(self.root, "b")}
+        )
+        self.assertEqual(self.names(), ["z", "A", "a0", "c"])
+
+    def test_snapshot(self):
+        entries = list(self.w_folder.body.entries)
+        self.w_folder.descend("z")
+        self.w_folder.ascend()
+        # The directory was not scanned again
+        self.assertEqual(
+            list(map(id, self.w_folder.body.entries)), list(map(id, entries))
+        )
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "z")
+
+        self.touch("d")
+        self.w_folder.descend("z")
+        self.w_folder.ascend()
+        self.assertEqual(self.names(), ["z", "A", "b", "c", "d"])
+
+    def test_leave_during_scan(self):
+        self.w_folder.descend("z")
+        # e.g. the scan of a huge folder, left right away for a folder whose
+        # snapshot is cached
+        scanner = self.w_folder._scanner = mock.Mock()
+        self.w_folder.ascend()
+        scanner.cancel.assert_called_once_with()
+        self.assertIsNone(self.w_folder._scanner)
+        # Late notifications of the cancelled scan are ignored
+        self.w_folder._on_scan_notified()
+        scanner.drain.assert_not_called()
+        self.assertEqual(self.names(), ["z", "A", "b", "c"])
+
+    def test_filter(self):
+        body = self.w_folder.body
+        self.touch("ab")
+        self.w_folder.refresh()
+        self.w_folder.focus_item_by_path(os.path.join(self.root, "ab"))
+
+        self.w_folder.set_filter("A")
+        visible = [body.entry_at(i).name for i in range(len(body))]
+        self.assertEqual(visible, ["A", "ab"])
+        # The focused item is still visible, and stays focused
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "ab")
+
+        self.w_folder.set_filter("ab")
+        self.assertEqual(len(body), 1)
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "ab")
+
+        # The filter is kept across refreshes
+        self.touch("cab")
+        self.w_folder.refresh()
+        visible = [body.entry_at(i).name for i in range(len(body))]
+        self.assertEqual(visible, ["ab", "cab"])
+
+        self.w_folder.set_filter("")
+        self.assertEqual(len(body), 6)
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "ab")
+
+    def test_selection(self):
+        # Nothing marked, the focused item is selected
+        selection = self.w_folder.get_selection()
+        self.assertEqual([entry.name for entry in selection], ["z"])
+
+        self.w_folder.toggle_mark()
+        self.w_folder.toggle_mark()
+        self.assertEqual(self.w_folder.get_focused_item().entry.name, "b")
+        self.w_folder.invert_marks()
+        selection = self.w_folder.get_selection()
+        self.assertEqual([entry.name for entry in selection], ["b", "c"])
+
+        paths = [entry.path for entry in selection]
+        self.w_folder.run_job(BatchJob("Remove", os.remove, paths))
+        self.assertEqual(self.names(), ["z", "A"])
+        self.assertEqual(self.w_folder.marked, set())
+
+
+class TestNotifier(unittest.TestCase):
+    def test_close(self):
+        loop = mock.Mock()
+        read_fd, write_fd = os.pipe()
+        loop.watch_pipe.return_value = write_fd
+        notifier = Notifier(loop, lambda data: None)
+        notifier()
+        self.assertEqual(os.read(read_fd, 10), b"\n")
+        notifier.close()
+        loop.remove_watch_pipe.assert_called_once_with(write_fd)
+        # Late notifications are ignored
+        notifier()
+        os.close(read_fd)
@@ -0,0 +1,218 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import Callable, Dict, Optional, Set
+
+from bfm.fs import directory_stamp
+
+# NB: `Watcher.read()` returns a mapping of the watched directories that
+# changed. Each one maps to the set of names that changed inside of it, or to
+# `None` when the whole directory must be rescanned (e.g. the events were lost,
+# or the watcher cannot tell which items changed).
+Changes = Dict[str, Optional[Set[str]]]
+
+
+class Watcher:
+    def fileno(self) -> Optional[int]:
+        # When None, `read` has to be polled periodically.
+        return None
+
+    def watch(self, path: str):
+        raise NotImplementedError
+
+    def unwatch(self, path: str):
+        raise NotImplementedError
+
+    def read(self) -> Changes:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(Watcher):
+    # Fallback relying on the directories mtime/ctime. It only detects that
+    # something changed, not what.
+    def __init__(self):
+        self._stamps = {}
+
+    @staticmethod
+    def _stamp(path: str):
+        try:
+            return directory_stamp(path)
+        except OSError:
+            return None
+
+    def watch(self, path: str):
+        self._stamps[path] = self._stamp(path)
+
+    def unwatch(self, path: str):
+        self._stamps.pop(path, None)
+
+    def read(self) -> Changes:
+        changes = {}
+        for path, stamp in self._stamps.items():
+            new_stamp = self._stamp(path)
+            if new_stamp != stamp:
+                self._stamps[path] = new_stamp
+                changes[path] = None
+        return changes
+
+
+class InotifyWatcher(Watcher):
+    # https://man7.org/linux/man-pages/man7/inotify.7.html
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+
+    MASK = (
+        IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+        | IN_ONLYDIR
+    )
+
+    _header = struct.Struct("iIII")
+
+    def __init__(self):
+        # XXX: raises OSError or AttributeError if inotify is not available
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise()
+        self._paths = {}  # wd -> path
+        self._wds = {}  # path -> wd
+
+    def _raise(self):
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def watch(self, path: str):
+        if path in self._wds:
+            return
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), self.MASK
+        )
+        if wd < 0:
+            self._raise()
+        self._paths[wd] = path
+        self._wds[path] = wd
+
+    def unwatch(self, path: str):
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            del self._paths[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self) -> Changes:
+        changes = {}
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._header.unpack_from(data, offset)
+                offset += self._header.size
+                end = offset + length
+                name, offset = data[offset:end].rstrip(b"\0"), end
+
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost, everything has to be rescanned
+                    changes.update(dict.fromkeys(self._wds))
+                    continue
+                path = self._paths.get(wd)
+                if path is None:
+                    continue
+                if mask & (
+                    self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED
+                ):
+                    # NB: the directory is gone (or elsewhere), its watch is
+                    # forgotten so that the path can be watched again (e.g.
+                    # once re-created), see `SharedWatcher.rewatch`.
+                    changes[path] = None
+                    self.unwatch(path)
+                elif changes.get(path, ()) is not None:
+                    changes.setdefault(path, set()).add(os.fsdecode(name))
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+
+class SharedWatcher:
+    # NB: Dispatches the changes noticed by a single `Watcher` to several
+    # listeners (e.g. the panes of a window). A directory is only watched once,
+    # as long as at least one listener watches it. Listeners are called with
+    # the directory and the names that changed (see `Changes`).
+    def __init__(self, watcher: Watcher):
+        self.watcher = watcher
+        self._listeners = {}  # path -> list of listeners
+
+    def fileno(self) -> Optional[int]:
+        return self.watcher.fileno()
+
+    def watch(self, path: str, listener: Callable):
+        listeners = self._listeners.get(path)
+        if listeners is None:
+            self.watcher.watch(path)
+            listeners = self._listeners[path] = []
+        listeners.append(listener)
+
+    def unwatch(self, path: str, listener: Callable):
+        listeners = self._listeners.get(path, [])
+        if listener in listeners:
+            listeners.remove(listener)
+            if not listeners:
+                del self._listeners[path]
+                self.watcher.unwatch(path)
+
+    def rewatch(self, path: str):
+        # Watch `path` again if it has listeners, e.g. after it was deleted
+        # then re-created. Does nothing if it is still watched.
+        if path in self._listeners:
+            try:
+                self.watcher.watch(path)
+            except OSError:
+                pass
+
+    def dispatch(self):
+        for path, names in self.watcher.read().items():
+            if names is None:
+                self.rewatch(path)
+            for listener in list(self._listeners.get(path, ())):
+                listener(path, names)
+
+
+def create_watcher() -> Watcher:
+    try:
+        return InotifyWatcher()
+    except (AttributeError, OSError):
+        return PollingWatcher()
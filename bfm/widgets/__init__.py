@@ -1,18 +1,18 @@
 import os
-import signal
 import subprocess
 import weakref
 
 import urwid
 from urwid import ExitMainLoop
 
-from bfm import config
+from bfm import config, stats
 from bfm.keys import CallableCommandsMixin, ExtendedCommandMap
-from bfm.vendor.ansi_widget import ANSIWidget
 
 from .fs import FolderWidget, ItemWidget
 from .layout import FocusableFrameWidget, LastRenderedSizeMixin
 from .misc import MyEdit
+from .popup import FinderPopUp, TextPopUp
+from .preview import PreviewWidget
 
 
 class RootWidget(
@@ -20,9 +20,19 @@ class RootWidget(
     LastRenderedSizeMixin,
     urwid.PopUpLauncher,
 ):
+    # NB: Each tab shows one or two folders side by side (see `split`), and
+    # the preview of the focused one. Folder widgets share their caches,
+    # watches and ongoing scans (see `FolderWidget`), so that showing a
+    # folder twice does not cost twice.
     _command_map = ExtendedCommandMap(
         {
             ":": lambda self: self._on_command_edit(),
+            "/": lambda self: self._on_filter_edit(),
+            "gt": lambda self, count=None: self.select_tab(
+                self._tab + 1 if count is None else count - 1
+            ),
+            "gT": lambda self, count=1: self.select_tab(self._tab - count),
+            "<tab>": lambda self: self.switch_pane(),
         },
     )
 
@@ -35,46 +45,137 @@ class RootWidget(
 
     def get_pop_up_parameters(self):
         W, H = self._LastRenderedSizeMixin__size
-        w, h = 42, 3
+        w, h = self._pop_up_widget.get_size(W, H)
         x, y = W // 2 - w // 2, H // 2 - h // 2
         return {"left": x, "top": y, "overlay_width": w, "overlay_height": h}
 
     def __init__(self, path: str):
         w_path = urwid.Text("")
 
-        w_folder = FolderWidget()
-        w_preview = ANSIWidget()
-        w_body = urwid.Columns([w_folder, w_preview], dividechars=1)
+        w_preview = PreviewWidget()
+        w_tab = urwid.Columns([], dividechars=1)
+        w_body = urwid.Columns([w_tab, w_preview], dividechars=1)
 
         w_extra = urwid.Text("")
+        w_jobs = urwid.Text("")
         w_command = MyEdit()
-        w_footer = urwid.Pile([w_extra, w_command])
+        w_footer = urwid.Pile(
+            [urwid.Columns([w_extra, ("pack", w_jobs)]), w_command]
+        )
 
         w_frame = FocusableFrameWidget(w_path, w_body, w_footer)
 
         # XXX: are weakrefs necessary?
         self._w_path = weakref.proxy(w_path)
         self._w_command = weakref.proxy(w_command)
-        self._w_folder = weakref.proxy(w_folder)
+        self._w_body = weakref.proxy(w_body)
         self._w_preview = weakref.proxy(w_preview)
         self._w_extra = weakref.proxy(w_extra)
+        self._w_jobs = weakref.proxy(w_jobs)
         self._w_frame = weakref.proxy(w_frame)
 
-        from bfm import loop
-
-        self._preview_pipe_fd = loop.watch_pipe(self._w_preview.append)
-
         # fmt: off
         urwid.connect_signal(w_command, "aborted", self._on_command_aborted)
         urwid.connect_signal(w_command, "validated", self._on_command_validated)
-        urwid.connect_signal(w_folder, "focus_changed", self._on_folder_focus_changed)  # noqa: E501
-        urwid.connect_signal(w_folder, "path_changed", self._on_folder_path_changed)  # noqa: E501
-        urwid.connect_signal(w_folder, "refreshed", self._on_folder_refreshed)  # noqa: E501
+        urwid.connect_signal(w_command, "postchange", self._on_command_changed)
         # fmt: on
 
         urwid.PopUpLauncher.__init__(self, w_frame)
 
+        self._filtering = False
+        # Tabs are the columns of their folder widgets
+        self._tabs = [w_tab]
+        self._tab = 0
+        # Per folder widget
+        self._scan_counts = {}
+        self._job_progress = {}
+
+        w_tab.contents.append((self._create_folder(path), w_tab.options()))
+        self._update_body()
+
+    @property
+    def _w_folder(self) -> FolderWidget:
+        # The focused folder widget
+        return self._tabs[self._tab].focus
+
+    def _create_folder(self, path: str) -> FolderWidget:
+        # NB: the widget is not shown yet, its signals are only taken into
+        # account once it is focused.
+        w_folder = FolderWidget()
+        # fmt: off
+        urwid.connect_signal(w_folder, "focus_changed", self._on_folder_focus_changed, user_args=[w_folder])  # noqa: E501
+        urwid.connect_signal(w_folder, "path_changed", self._on_folder_path_changed, user_args=[w_folder])  # noqa: E501
+        urwid.connect_signal(w_folder, "refreshed", self._on_folder_refreshed, user_args=[w_folder])  # noqa: E501
+        urwid.connect_signal(w_folder, "scan_progress", self._on_folder_scan_progress, user_args=[w_folder])  # noqa: E501
+        urwid.connect_signal(w_folder, "job_progress", self._on_folder_job_progress, user_args=[w_folder])  # noqa: E501
+        # fmt: on
         w_folder.change_path(path)
+        return w_folder
+
+    def _close_folder(self, w_folder: FolderWidget):
+        w_folder.close()
+        self._scan_counts.pop(w_folder, None)
+        self._job_progress.pop(w_folder, None)
+        self._update_jobs()
+
+    def new_tab(self, path: str = None):
+        # The new tab shows `path`, or the focused folder, next to the current
+        # tab.
+        w_folder = self._create_folder(path or self._w_folder.path)
+        w_tab = urwid.Columns([w_folder], dividechars=1)
+        self._tabs.insert(self._tab + 1, w_tab)
+        self.select_tab(self._tab + 1)
+
+    def close_tab(self):
+        if len(self._tabs) == 1:
+            self.error("Cannot close the last tab")
+            return
+        w_tab = self._tabs.pop(self._tab)
+        for w_folder, _ in w_tab.contents:
+            self._close_folder(w_folder)
+        self.select_tab(min(self._tab, len(self._tabs) - 1))
+
+    def select_tab(self, index: int):
+        self._tab = index % len(self._tabs)
+        self._update_body()
+
+    def split(self, path: str = None):
+        # Show `path`, or the focused folder, next to the focused folder
+        w_tab = self._tabs[self._tab]
+        if len(w_tab.contents) > 1:
+            self.error("The tab is already split")
+            return
+        w_folder = self._create_folder(path or self._w_folder.path)
+        w_tab.contents.append((w_folder, w_tab.options()))
+        w_tab.focus_position = 1
+        self._update_body()
+
+    def only(self):
+        # Close the other folder of the tab
+        w_tab = self._tabs[self._tab]
+        if len(w_tab.contents) > 1:
+            w_folder = w_tab.contents.pop(1 - w_tab.focus_position)[0]
+            self._close_folder(w_folder)
+            self._update_body()
+
+    def switch_pane(self):
+        w_tab = self._tabs[self._tab]
+        if len(w_tab.contents) > 1:
+            w_tab.focus_position = 1 - w_tab.focus_position
+            self._update_body()
+
+    def _update_body(self):
+        # NB: the preview is as wide as each folder
+        w_tab = self._tabs[self._tab]
+        options = self._w_body.options("weight", len(w_tab.contents))
+        self._w_body.contents[0] = (w_tab, options)
+        self._w_body.focus_position = 0
+        self._update_header()
+        self.preview(self._w_folder.get_focused_item())
+
+    @stats.timed("render")
+    def render(self, size, focus: bool = False):
+        return super().render(size, focus)
 
     def error(self, message: str):
         self._w_command.set_caption(("error", message))
@@ -91,35 +192,17 @@ class RootWidget(
             input_state.clear()
         return key
 
+    @stats.timed("preview")
     def preview(self, w_item: ItemWidget):
-        self._w_preview.clear()
-
-        if hasattr(self, "_preview_proc"):
-            # [0]: Since `shell=True` is used in `subprocess.Popen(...)`, a
-            # simple call to `self._preview_proc.kill()` cannot be used. The
-            # process' children would not be killed and could still write to
-            # stdout.
-            # https://stackoverflow.com/questions/4789837/how-to-terminate-a-python-subprocess-launched-with-shell-true
-            os.killpg(os.getpgid(self._preview_proc.pid), signal.SIGTERM)
-            del self._preview_proc
-
         if w_item:
             extra = w_item.extra_metadata()
-
-            if os.path.isdir(w_item.path):
-                command = config.folder_preview
-            else:
-                command = config.file_preview
-            self._preview_proc = subprocess.Popen(
-                command.format(path=w_item.path),
-                shell=True,
-                stdout=self._preview_pipe_fd,
-                stderr=subprocess.STDOUT,
-                close_fds=True,
-                preexec_fn=os.setsid,  # see [0]
+            self._w_preview.preview(
+                w_item.entry,
+                self._w_folder.get_neighbours(config.preview_prefetch),
             )
         else:
             extra = ""
+            self._w_preview.preview(None)
 
         self._w_extra.set_text(extra)
 
@@ -127,12 +210,32 @@ class RootWidget(
         self._w_frame.focus_footer()
         self._w_command.set_caption(":")
 
+    def _on_filter_edit(self):
+        self._filtering = True
+        self._w_frame.focus_footer()
+        self._w_command.set_caption("/")
+        self._w_command.set_edit_text(self._w_folder.body.filter)
+
+    def _on_command_changed(self, w_command: MyEdit, old_text: str):
+        if self._filtering:
+            self._w_folder.set_filter(w_command.get_edit_text())
+            self._update_header()
+
     def _on_command_aborted(self, text: str):
+        self._filtering = False
         self._w_frame.focus_body()
 
     def _on_command_validated(self, text: str):
         self._w_frame.focus_body()
 
+        if self._filtering:
+            self._filtering = False
+            # NB: the edit was reset before this signal, which cleared the
+            # filter.
+            self._w_folder.set_filter(text)
+            self._update_header()
+            return
+
         if text == "q":
             raise ExitMainLoop
 
@@ -146,6 +249,49 @@ class RootWidget(
             self._w_folder.body.set_focus(lineno)
             return
 
+        if text in ["preview native", "preview rich"]:
+            self._w_preview.native = text == "preview native"
+            self.preview(self._w_folder.get_focused_item())
+            return
+
+        if text.split()[0:1] == ["stats"]:
+            self._on_stats_command(text.split()[1:])
+            return
+
+        if text == "cancel":
+            self._w_folder.cancel_jobs()
+            return
+
+        if text == "find":
+            w_pop_up = FinderPopUp(self._w_folder.path)
+            urwid.connect_signal(w_pop_up, "close", self._on_finder_closed)
+            self.open_pop_up(w_pop_up)
+            return
+
+        if text.split()[0:1] in [["tabnew"], ["split"]]:
+            args = text.split(maxsplit=1)[1:]
+            path = None
+            if args:
+                path = os.path.join(
+                    self._w_folder.path, os.path.expanduser(args[0])
+                )
+                if not os.path.isdir(path):
+                    self.error("'{}': Not a directory".format(args[0]))
+                    return
+            if text.startswith("tabnew"):
+                self.new_tab(path)
+            else:
+                self.split(path)
+            return
+
+        if text == "tabclose":
+            self.close_tab()
+            return
+
+        if text == "only":
+            self.only()
+            return
+
         if text.startswith("!"):
             subprocess.call(text[1:], shell=True, cwd=self._w_folder.path)
             # TODO: conditionally refresh
@@ -154,12 +300,77 @@ class RootWidget(
 
         self.error("Not an editor command: {}".format(text))
 
-    def _on_folder_focus_changed(self, w_item: ItemWidget):
-        self.preview(w_item)
-
-    def _on_folder_path_changed(self, old_path: str, new_path: str):
-        self._w_path.set_text(("path", new_path))
-        self._w_preview.clear()
-
-    def _on_folder_refreshed(self):
-        self.preview(self._w_folder.get_focused_item())
+    def _on_stats_command(self, args: list):
+        if args == ["on"]:
+            stats.enable()
+        elif args == ["off"]:
+            stats.disable()
+        elif args == ["reset"]:
+            stats.reset()
+        elif args:
+            self.error("Usage: stats [on|off|reset]")
+        elif not stats.enabled and not stats.report()[1:]:
+            self.error("Statistics are disabled, enable them with :stats on")
+        else:
+            self.open_pop_up(TextPopUp("Statistics", stats.report()))
+
+    def _on_finder_closed(self, success: bool, path: str = None):
+        if success:
+            self._w_folder.jump_to(path)
+
+    # NB: folder widgets which are not focused (other pane, other tab) are
+    # still updated in the background, but do not drive the preview.
+
+    def _on_folder_focus_changed(self, w_folder: FolderWidget, w_item):
+        if w_folder is self._w_folder:
+            self.preview(w_item)
+
+    def _on_folder_path_changed(
+        self, w_folder: FolderWidget, old_path: str, new_path: str
+    ):
+        self._scan_counts.pop(w_folder, None)
+        self._update_header()
+        if w_folder is self._w_folder:
+            self._w_preview.preview(None)
+
+    def _on_folder_refreshed(self, w_folder: FolderWidget):
+        if w_folder is self._w_folder:
+            self.preview(w_folder.get_focused_item())
+
+    def _on_folder_scan_progress(
+        self, w_folder: FolderWidget, count: int, done: bool
+    ):
+        if done:
+            self._scan_counts.pop(w_folder, None)
+        else:
+            self._scan_counts[w_folder] = count
+        self._update_header()
+
+    def _on_folder_job_progress(self, w_folder: FolderWidget, progress: str):
+        self._job_progress[w_folder] = progress
+        self._update_jobs()
+
+    def _update_jobs(self):
+        progress = filter(None, self._job_progress.values())
+        self._w_jobs.set_text(" | ".join(progress))
+
+    def _update_header(self):
+        markup = []
+        if len(self._tabs) > 1:
+            for i, w_tab in enumerate(self._tabs):
+                name = os.path.basename(w_tab.focus.path) or "/"
+                attr = "tab_focus" if i == self._tab else "tab"
+                markup.append((attr, " {}:{} ".format(i + 1, name)))
+            markup.append(" ")
+        for w_folder, _ in self._tabs[self._tab].contents:
+            if w_folder is self._w_folder:
+                markup.append(("path", w_folder.path))
+            else:
+                markup.append(w_folder.path)
+            count = self._scan_counts.get(w_folder)
+            if count is not None:
+                markup.append(" [{}...]".format(count))
+            if w_folder.body.filter:
+                markup.append(" /{}".format(w_folder.body.filter))
+            markup.append("  ")
+        self._w_path.set_text(markup[:-1])
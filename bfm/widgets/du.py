@@ -0,0 +1,137 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from bfm import config
+from bfm.du import DiskUsageCache, disk_usage
+from bfm.fs import Entry, format_size
+from bfm.main_loop import Notifier
+
+
+class DiskUsageMixin:
+    # NB: When enabled, the recursive size of each folder of the listing is
+    # computed by a pool of worker threads. Each row is updated as soon as the
+    # size of its folder is known.
+
+    # Shared by all instances, lazily created
+    _du_cache = None
+    _du_executor = None
+
+    def __init__(self):
+        # Maps folder paths to their recursive size. None when disabled.
+        self.disk_usage = None
+        self.sort_by_disk_usage = False
+        self._du_jobs = {}  # path -> (future, cancellation event)
+        self._du_queue = queue.SimpleQueue()
+        self._du_notifier = None
+
+    def toggle_disk_usage(self):
+        if self.disk_usage is None:
+            self.disk_usage = {}
+            self.compute_disk_usage()
+        else:
+            self.cancel_disk_usage()
+            self.disk_usage = None
+            if self.sort_by_disk_usage:
+                self.toggle_sort_by_disk_usage()
+        # Widgets are lazily created again, with the new sizes
+        self.body.clear_widgets()
+        self._invalidate()
+
+    def toggle_sort_by_disk_usage(self):
+        if self.disk_usage is None:
+            self.toggle_disk_usage()
+        self.sort_by_disk_usage = not self.sort_by_disk_usage
+        self.resort()
+
+    def disk_usage_key(self, entry: Entry):
+        # Biggest items first. Folders whose size is not known yet come last.
+        if entry.is_dir and not entry.is_link:
+            size = self.disk_usage.get(entry.path, -1)
+        elif entry.hydrated:
+            size = entry.stat.st_blocks * 512
+        else:
+            size = -1
+        return (-size, entry.lower_name)
+
+    def get_disk_usage(self, entry: Entry) -> Optional[str]:
+        # The text to display instead of the size of the folder inode
+        if self.disk_usage is None or not entry.is_dir or entry.is_link:
+            return None
+        size = self.disk_usage.get(entry.path)
+        return "..." if size is None else format_size(size)
+
+    def compute_disk_usage(self):
+        if self.disk_usage is None:
+            return
+
+        cls = DiskUsageMixin
+        if cls._du_cache is None:
+            cls._du_cache = DiskUsageCache(config.du_cache_path)
+            cls._du_executor = ThreadPoolExecutor(config.du_workers)
+
+        if self._background and self._du_notifier is None:
+            from bfm import loop
+
+            self._du_notifier = Notifier(loop, self._on_disk_usage_notified)
+
+        for entry in self.body.entries:
+            path = entry.path
+            if (
+                not entry.is_dir
+                or entry.is_link
+                or path in self.disk_usage
+                or path in self._du_jobs
+            ):
+                continue
+            cancelled = threading.Event()
+            if self._background:
+                future = cls._du_executor.submit(
+                    self._compute_disk_usage, path, cancelled
+                )
+                self._du_jobs[path] = (future, cancelled)
+            else:
+                self._compute_disk_usage(path, cancelled)
+                self._on_disk_usage_notified()
+
+    def cancel_disk_usage(self):
+        for future, cancelled in self._du_jobs.values():
+            future.cancel()
+            cancelled.set()
+        self._du_jobs.clear()
+
+    def _compute_disk_usage(self, path: str, cancelled: threading.Event):
+        # NB: runs in a worker thread
+        try:
+            size = disk_usage(path, self._du_cache, cancelled.is_set)
+        except Exception:
+            size = None
+        self._du_queue.put((path, size))
+        if self._du_notifier is not None:
+            self._du_notifier()
+
+    def _on_disk_usage_notified(self, data: bytes = b""):
+        changed = False
+        while True:
+            try:
+                path, size = self._du_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._du_jobs.pop(path, None)
+            if (
+                self.disk_usage is None
+                or size is None
+                or os.path.dirname(path) != self.path
+            ):
+                continue
+            self.disk_usage[path] = size
+            w_item = self.body.get_widget(path)
+            if w_item is not None:
+                w_item.size = self.get_disk_usage(w_item.entry)
+                w_item.update_widget()
+            changed = True
+
+        if changed and self.sort_by_disk_usage:
+            self._schedule_resort()
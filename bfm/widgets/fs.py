@@ -1,140 +1,161 @@
 import os
 import stat
 import subprocess
-from datetime import datetime
-from functools import wraps
-from grp import getgrgid
-from pwd import getpwuid
 
 import urwid
-from humanize import naturalsize
-from send2trash import send2trash
 
-from bfm import config
-from bfm.fs import TreeNavigationMixin, pretty_name
-from bfm.keys import CallableCommandsMixin, ExtendedCommandMap
-from bfm.vendor.bisect import insort_left
-
-from .popup import EditPopUp
+from bfm import config, stats
+from bfm.cache import LRUCache
+from bfm.fs import (
+    Entry,
+    Scanner,
+    SharedScanner,
+    TreeNavigationMixin,
+    directory_stamp,
+    format_mtime,
+    format_size,
+    group_name,
+    long_metadata,
+    placeholder_metadata,
+    pretty_name,
+    user_name,
+)
+from bfm.keys import CallableCommandsMixin, ExtendedCommandMap, repeatable
+from bfm.main_loop import Notifier
+from bfm.sorting import name_key, sort_entries
+from bfm.watch import SharedWatcher, create_watcher
+
+from .du import DiskUsageMixin
+from .hydration import HydrationMixin
+from .selection import SelectionMixin
+from .sort import SortMixin
+from .walker import EntryListWalker
 
 
 class ItemWidget(CallableCommandsMixin, urwid.WidgetWrap):
-    signals = ["require_refresh", "selected"]
+    signals = ["selected"]
     _command_map = ExtendedCommandMap(
         {
             "l": lambda self: urwid.emit_signal(self, "selected", self),
-            "m": lambda self: self.move(),
-            "dd": lambda self: self.delete(),
         },
         aliases={"<enter>": "l", "<right>": "l"},
     )
 
-    def _preverify_path(factory=lambda: None):
-        # ItemWidget can potentially represent an item that no longer exists
-        # (e.g. deleted by an external action in the meantime). This decorator
-        # can thus be used to check if `self.path` is still valid. If not, it
-        # returns `factory()`.
-        # XXX: This is probably not 100% error proof, but I think it is good
-        # enough.
-        def decorator(f):
-            @wraps(f)
-            def wrapper(self, *args, **kwargs):
-                # XXX: This won't detect broken symlinks on some platforms
-                if os.path.lexists(self.path):
-                    return f(self, *args, **kwargs)
-                else:
-                    from bfm import w_root
-
-                    w_root.error(
-                        "'{}': No such file or directory".format(self.path)
-                    )
-                    return factory()
-
-            return wrapper
-
-        return decorator
-
-    def __init__(self, path: str):
-        self.path = path
+    def __init__(
+        self,
+        entry: Entry,
+        long_listing: bool = False,
+        size: str = None,
+        marked: bool = False,
+    ):
+        self.entry = entry
+        self.long_listing = long_listing
+        self.marked = marked
+        # Overrides the displayed size (e.g. with the disk usage of a folder)
+        self.size = size
         w = self.generate_widget()
         super().__init__(w)
 
-    # @_preverify_path()
+    @property
+    def path(self) -> str:
+        return self.entry.path
+
+    def selectable(self) -> bool:
+        return True
+
+    @stats.timed("generate_widget")
     def generate_widget(self) -> urwid.Widget:
-        metadata = naturalsize(
-            os.stat(self.path, follow_symlinks=False).st_size, gnu=True
-        )
-        if os.path.islink(self.path):
+        entry = self.entry
+        if self.long_listing:
+            metadata = long_metadata(entry, self.size)
+        elif entry.hydrated:
+            metadata = self.size or format_size(entry.stat.st_size)
+        else:
+            metadata = placeholder_metadata(entry)
+        if entry.is_link:
             attr = "symlink"
-            metadata = "-> {} {}".format(
-                pretty_name(os.readlink(self.path), basename=False), metadata
-            )
-        elif os.path.isdir(self.path):
+            if entry.hydrated:
+                metadata = "-> {}{} {}".format(
+                    entry.link_target, entry.suffix, metadata
+                )
+        elif entry.is_dir:
             attr = "folder"
         else:
             attr = "file"
+        if self.marked:
+            attr = "marked"
+        elif entry.stale:
+            attr = "stale"
 
-        w_name = urwid.Text(pretty_name(self.path))
+        w_name = urwid.Text(pretty_name(entry))
         w_metadata = urwid.Text(metadata)
         w = urwid.Columns([w_name, ("pack", w_metadata)])
-        w._selectable = True  # XXX: which widget should be selectable?
         w = urwid.Padding(w, left=1, right=1)
         w = urwid.AttrMap(w, attr, focus_map="focus")
         return w
 
-    @_preverify_path(factory=str)
     def extra_metadata(self) -> str:
-        stats = os.stat(self.path, follow_symlinks=False)
+        # NB: no syscall here, the metadata of the entry is used as is
+        stats = self.entry.stat
+        if stats is None:
+            return placeholder_metadata(self.entry)
         mode = stat.filemode(stats.st_mode)
         nlink = stats.st_nlink
-        user = getpwuid(stats.st_uid).pw_name
-        group = getgrgid(stats.st_gid).gr_name
-        mtime = datetime.utcfromtimestamp(stats.st_mtime).strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
+        user = user_name(stats.st_uid)
+        group = group_name(stats.st_gid)
+        mtime = format_mtime(stats)
         return " ".join(map(str, [mode, nlink, user, group, mtime]))
 
-    def update_widget(self):
+    def update_widget(self, entry: Entry = None):
+        if entry is not None:
+            self.entry = entry
         self._w = self.generate_widget()
 
-    @_preverify_path()
-    def delete(self):
-        # BUG found: send2trash raises an Exception is we try to delete a broken
-        # symlink. It seems to correctly delete a valid symlink though.
-        send2trash(self.path)
-        urwid.emit_signal(self, "require_refresh")
-
-    @_preverify_path()
-    def move(self):
-        def on_close(success: bool, text: str):
-            if not success:
-                return
-            src = self.path
-            dst = text
-            try:
-                os.renames(src, dst)
-            except Exception:
-                # TODO: display error
-                return
-            urwid.emit_signal(self, "require_refresh", dst)
-
-        from bfm import w_root
 
-        w_pop_up = EditPopUp(title="Move to", text=self.path)
-        urwid.connect_signal(w_pop_up, "close", on_close)
-        w_root.open_pop_up(w_pop_up)
-
-
-class FolderWidget(CallableCommandsMixin, TreeNavigationMixin, urwid.ListBox):
-    signals = ["focus_changed", "path_changed", "refreshed"]
+class FolderWidget(
+    CallableCommandsMixin,
+    DiskUsageMixin,
+    HydrationMixin,
+    SelectionMixin,
+    SortMixin,
+    TreeNavigationMixin,
+    urwid.ListBox,
+):
+    signals = [
+        "focus_changed",
+        "path_changed",
+        "refreshed",
+        "scan_progress",
+        "job_progress",
+    ]
     _command_map = ExtendedCommandMap(
         {
-            "h": lambda self: self.ascend(),
-            "j": "cursor down",
-            "k": "cursor up",
-            "gg": "cursor max left",
-            "G": "cursor max right",
+            "h": repeatable(lambda self: self.ascend()),
+            "j": lambda self, count=1: self.move_focus(count),
+            "k": lambda self, count=1: self.move_focus(-count),
+            "gg": lambda self, count=1: self.focus_position(count - 1),
+            "G": lambda self, count=None: self.focus_position(
+                len(self.body) - 1 if count is None else count - 1
+            ),
             "r": lambda self: self.refresh(True),
+            "L": lambda self: self.toggle_long_listing(),
+            "du": lambda self: self.toggle_disk_usage(),
+            "ds": lambda self: self.toggle_sort_by_disk_usage(),
+            "on": lambda self: self.set_sort_order("name"),
+            "ov": lambda self: self.set_sort_order("natural"),
+            "os": lambda self: self.set_sort_order("size"),
+            "om": lambda self: self.set_sort_order("mtime"),
+            "oe": lambda self: self.set_sort_order("extension"),
+            "or": lambda self: self.toggle_sort_reverse(),
+            " ": lambda self, count=1: self.toggle_mark(count),
+            "V": lambda self: self.mark_range(),
+            "*": lambda self: self.invert_marks(),
+            "U": lambda self: self.clear_marks(),
+            "dd": lambda self, count=None: self.trash_selection(count),
+            "m": lambda self, count=None: self.move_selection(count),
+            "yy": lambda self, count=None: self.yank_selection(False, count),
+            "yx": lambda self, count=None: self.yank_selection(True, count),
+            "p": lambda self: self.paste(),
         },
         aliases={
             "<backspace>": "h",
@@ -144,17 +165,77 @@ class FolderWidget(CallableCommandsMixin, TreeNavigationMixin, urwid.ListBox):
         },
     )
 
-    @staticmethod
-    def sorting_key(w_item: ItemWidget):
-        path = w_item.path
-        return (not os.path.isdir(path), os.path.basename(path).lower())
+    # Recently scanned directories, shared by all instances
+    _snapshots = LRUCache(
+        config.snapshot_cache_size,
+        # XXX: rough estimation of the memory used by an entry
+        weigh=lambda snapshot: sum(
+            400 + len(entry.path) + 2 * len(entry.name) for entry in snapshot[1]
+        ),
+    )
+    # NB: placeholders are listed, see `HydrationMixin`
+    _scans = SharedScanner(config.scan_batch_size, hydrate=False)
+    # Shared by all instances, lazily created
+    _watcher = None
+
+    # The default order, see `bfm.sorting`
+    sorting_key = staticmethod(name_key)
 
-    def __init__(self):
+    def __init__(self, background: bool = True):
         TreeNavigationMixin.__init__(self)
-        urwid.ListBox.__init__(self, urwid.SimpleListWalker([]))
+        DiskUsageMixin.__init__(self)
+        HydrationMixin.__init__(self)
+        SelectionMixin.__init__(self)
+        SortMixin.__init__(self)
+        walker = EntryListWalker(self.create_item, config.widget_cache_size)
+        urwid.ListBox.__init__(self, walker)
 
         self._focus_cache = {}
-        urwid.connect_signal(self, "focus_changed", self._on_focus_changed)
+        self._focus_alarm = None
+        urwid.connect_signal(self, "refreshed", self.compute_disk_usage)
+
+        self.long_listing = config.long_listing
+
+        # NB: `background` can be set to False to scan synchronously, e.g.
+        # when there is no main loop.
+        self._background = background
+        self._scanner = None
+        self._scan_notifier = None
+        self._scan_target = None
+        self._scan_progressive = False
+        self._scanned = {}
+        self._scan_stamp = None
+
+        self._watch_alarm = None
+        self._watch_pending = set()
+        self._watch_rescan = False
+
+    def close(self):
+        # Stop the background work of the instance, e.g. when its pane is
+        # closed. Running jobs go on, their results are simply not displayed.
+        if self._scanner is not None:
+            self._scanner.cancel()
+            self._scanner = None
+        self.cancel_hydration()
+        self.cancel_disk_usage()
+        if not self._background:
+            return
+
+        from bfm import loop
+
+        for name in ["_focus_alarm", "_resort_alarm", "_watch_alarm"]:
+            handle = getattr(self, name)
+            if handle is not None:
+                loop.remove_alarm(handle)
+                setattr(self, name, None)
+        for name in ["_scan_notifier", "_du_notifier", "_job_notifier"]:
+            notifier = getattr(self, name)
+            if notifier is not None:
+                # NB: late notifications of worker threads are ignored
+                notifier.close()
+                setattr(self, name, None)
+        if self.path is not None:
+            self._watcher.unwatch(self.path, self._on_watch_changes)
 
     def ascend(self):
         new_path, from_ = os.path.split(self.path)
@@ -162,9 +243,25 @@ class FolderWidget(CallableCommandsMixin, TreeNavigationMixin, urwid.ListBox):
         self.change_path(new_path)
         return from_
 
-    def create_item(self, path: str):
-        w_item = ItemWidget(path)
-        urwid.connect_signal(w_item, "require_refresh", self.refresh)
+    def jump_to(self, path: str):
+        # Focus the item at `path`, changing the current folder if needed
+        parent = os.path.dirname(path)
+        if parent == self.path:
+            self.focus_item_by_path(path)
+        else:
+            self._focus_cache[parent] = path
+            self.change_path(parent)
+
+    def create_item(self, entry: Entry):
+        if not entry.hydrated and self._background:
+            # Visible items are hydrated first
+            self.hydrate([entry.path], first=True, reuse=True)
+        w_item = ItemWidget(
+            entry,
+            self.long_listing,
+            self.get_disk_usage(entry),
+            entry.path in self.marked,
+        )
         urwid.connect_signal(w_item, "selected", self._on_item_selected)
         return w_item
 
@@ -181,10 +278,9 @@ class FolderWidget(CallableCommandsMixin, TreeNavigationMixin, urwid.ListBox):
         if not self.body:
             return
         if target_path:
-            for i, w_item in enumerate(self.body):
-                if w_item.path == target_path:
-                    break
-            else:
+            try:
+                i = self.body.index(target_path)
+            except KeyError:
                 # TODO: display error message
                 return
         else:
@@ -193,70 +289,413 @@ class FolderWidget(CallableCommandsMixin, TreeNavigationMixin, urwid.ListBox):
         # trigger the "modified" signal 3 times instead of once.
         self.body.set_focus(i)
 
+    def move_focus(self, offset: int):
+        # NB: whatever the offset, the focus only changes once, i.e. a single
+        # preview and redraw. Moving past the first or last item is a no-op.
+        self.focus_position(self.body.focus + offset)
+
+    def focus_position(self, position: int):
+        if self.body:
+            # XXX: see focus_item_by_path
+            self.body.set_focus(position)
+
+    def get_neighbours(self, count: int) -> list:
+        # Entries around the focused one, the closest first
+        focus = self.body.focus
+        neighbours = []
+        for distance in range(1, count + 1):
+            for i in [focus + distance, focus - distance]:
+                if 0 <= i < len(self.body):
+                    neighbours.append(self.body.entry_at(i))
+        return neighbours
+
+    def set_filter(self, text: str):
+        # Only show the items whose name contains `text` (case insensitive)
+        self.body.set_filter(text)
+
+    def toggle_long_listing(self):
+        self.long_listing = not self.long_listing
+        # Widgets are lazily created again, with the new layout
+        self.body.clear_widgets()
+        self._invalidate()
+
     def get_focused_item(self) -> ItemWidget:
         return self.get_focus()[0] if self.body else None
 
-    def keypress(self, size, key):
-        key = super().keypress(size, key)
-
-        # When pressing `j` at the bottom most item, or `k` a the top most one,
-        # the default behaviour is to mark them as unhandled. We modify this
-        # behaviour and always mark "j" and "k" as handled.
-        if key in ["j", "k"]:
-            return
-
-        return key
-
+    @stats.timed("refresh")
     def refresh(self, change_focus: bool = False):
         # NB: change_focus can be:
         # a boolean: if True, it will focus the item based on `_focus_cache`.
         # a path (str): it will focus the item corresponding to that path.
+        # The directory is scanned in a worker thread, see `_on_scan_notified`
+        # for how the results are handled.
+        if self._scanner is not None:
+            # NB: reset right away, as the snapshot may make a new scan useless
+            self._scanner.cancel()
+            self._scanner = None
+
+        if change_focus is True:
+            change_focus = self._focus_cache.get(self.path)
+        elif change_focus is False:
+            change_focus = None
+        self._scan_target = change_focus
+        # When the listing is empty (e.g. just after a path change), it is
+        # filled progressively. Otherwise, it is updated once the scan is done.
+        self._scan_progressive = not self.body.entries
+        self._scanned = {}
+
+        if self._scan_progressive and self._load_snapshot():
+            return
+
+        if self._background:
+            from bfm import loop
+
+            if self._watcher is not None:
+                # NB: e.g. the folder was deleted then re-created
+                self._watcher.rewatch(self.path)
+            if self._scan_notifier is None:
+                self._scan_notifier = Notifier(loop, self._on_scan_notified)
+            notify = self._scan_notifier
+            # NB: when the folder is already being scanned (e.g. by another
+            # pane), the ongoing scan is followed instead.
+            self._scanner = self._scans.scan(self.path, notify)
+        else:
+            self._scanner = Scanner(
+                self.path, batch_size=config.scan_batch_size
+            )
+            self._scanner.run()
+            self._on_scan_notified()
+
+    @stats.timed("apply_changes")
+    def apply_changes(self, upserts: dict, removals: set):
+        # Apply targeted changes to the listing, without rescanning it.
+        # `upserts` maps paths to their new `Entry`, and `removals` is a set of
+        # paths that no longer exist.
         signal_args = (self.body, "modified", self._on_body_modified)
         urwid.disconnect_signal(*signal_args)
 
-        paths = list(self.scanpath())
-        # Remove items that no longer belong here
-        for w_item in list(self.body):
-            if w_item.path in paths:
-                w_item.update_widget()
-                paths.remove(w_item.path)
+        w_focused = self.get_focused_item()
+        self._snapshots.pop(self.path)
+        body = self.body
+        removals = {p for p in removals if body.get_entry(p) is not None}
+        inserts = []
+        resort = False
+        sort_key = self.sort_key
+        for entry in upserts.values():
+            old_entry = body.get_entry(entry.path)
+            if old_entry is None:
+                inserts.append(entry)
+            elif sort_key(old_entry) == sort_key(entry):
+                if (
+                    old_entry.stat != entry.stat
+                    or old_entry.stale != entry.stale
+                ):
+                    body.update_entry(entry)
+            elif not old_entry.hydrated:
+                # NB: the metadata of placeholders arrives by batches, which
+                # would each sort the whole listing again (e.g. by mtime).
+                body.update_entry(entry)
+                resort = True
             else:
-                self.body.remove(w_item)
-        # Add missing items
-        for path in paths:
-            w_item = self.create_item(path)
-            insort_left(self.body, w_item, key=self.sorting_key)
-
-        if change_focus:
-            if change_focus is True:
-                target_path = self._focus_cache.get(self.path)
+                # The position of the item may change
+                inserts.append(entry)
+        if removals or inserts:
+            dropped = removals.union(entry.path for entry in inserts)
+            entries = [e for e in body.entries if e.path not in dropped]
+            entries.extend(inserts)
+            self._set_entries(self.sort_entries(entries))
+        if resort:
+            self._schedule_resort()
+
+        urwid.connect_signal(*signal_args)
+
+        self.compute_disk_usage()
+
+        if w_focused is not None and (
+            w_focused.path in upserts or w_focused.path in removals
+        ):
+            urwid.emit_signal(self, "refreshed")
+
+    def _focus_scan_target(self):
+        if self._scan_target:
+            try:
+                self.body.set_focus(self.body.index(self._scan_target))
+            except KeyError:
+                pass
             else:
-                target_path = change_focus
-            self.focus_item_by_path(target_path)
+                self._scan_target = None
+
+    @classmethod
+    def get_snapshot(cls, path: str):
+        # Return the sorted entries of a recent scan of `path`, as long as the
+        # directory did not change since then. Otherwise, return None.
+        # XXX: the returned list must not be modified
+        snapshot = cls._snapshots.get(path)
+        if snapshot is None:
+            return None
+        stamp, entries, _ = snapshot
+        try:
+            if directory_stamp(path) != stamp:
+                return None
+        except OSError:
+            return None
+        return entries
+
+    def _store_snapshot(self):
+        # NB: snapshots are always sorted with the default key. The paths of
+        # the entries whose metadata is missing are stored along.
+        if self._scan_stamp is not None and self._scanner is None:
+            missing = [
+                e.path for e in self.body.entries if e.stat is None or e.stale
+            ]
+            # NB: another instance (e.g. the other pane) may have stored the
+            # same snapshot already.
+            snapshot = self._snapshots.get(self.path)
+            if (
+                snapshot is not None
+                and snapshot[0] == self._scan_stamp
+                and len(snapshot[2]) <= len(missing)
+            ):
+                return
+            entries = sort_entries(self.body.entries)
+            self._snapshots.put(self.path, (self._scan_stamp, entries, missing))
 
+    def _load_snapshot(self) -> bool:
+        # Returns False if there is no usable snapshot.
+        entries = self.get_snapshot(self.path)
+        if entries is None:
+            return False
+        self._scan_stamp, _, missing = self._snapshots.get(self.path)
+
+        signal_args = (self.body, "modified", self._on_body_modified)
+        urwid.disconnect_signal(*signal_args)
+        # NB: the listing works on a copy, so that the cached snapshot is not
+        # altered by incremental updates.
+        if self.sort_key is self.sorting_key and not self.sort_reverse:
+            self.body.set_entries(list(entries))
+        else:
+            self.body.set_entries(self.sort_entries(entries))
+        self._focus_scan_target()
         urwid.connect_signal(*signal_args)
 
+        if missing:
+            self.hydrate(missing, reuse=True)
+
+        urwid.emit_signal(self, "scan_progress", len(entries), True)
         urwid.emit_signal(self, "refreshed")
+        return True
+
+    def _apply_snapshot(self, new: dict):
+        old = {entry.path: entry for entry in self.body.entries}
+        for path, entry in new.items():
+            # NB: a placeholder does not replace a known entry of the same
+            # type, whose metadata is refreshed in the background instead.
+            old_entry = old.get(path)
+            if (
+                not entry.hydrated
+                and old_entry is not None
+                and old_entry.is_link == entry.is_link
+                and (entry.is_link or old_entry.is_dir == entry.is_dir)
+            ):
+                new[path] = old_entry
+
+        removed = old.keys() - new.keys()
+        added = new.keys() - old.keys()
+        modified = [
+            new[path]
+            for path in old.keys() - removed
+            if old[path].stat != new[path].stat
+        ]
+
+        sort_key = self.sort_key
+        if (
+            removed
+            or added
+            or any(sort_key(old[e.path]) != sort_key(e) for e in modified)
+        ):
+            self._set_entries(self.sort_entries(new.values()))
+        # Only the items that actually changed are updated
+        for entry in modified:
+            self.body.update_entry(entry)
+
+    def _set_entries(self, entries: list):
+        # NB: replacing the whole content at once only triggers a single
+        # "modified" notification. The focused item, if any, stays focused.
+        w_focused = self.get_focused_item()
+        self.body.set_entries(entries)
+        if w_focused is not None:
+            try:
+                self.body.set_focus(self.body.index(w_focused.path))
+            except KeyError:
+                pass
+
+    @stats.timed("refresh.merge")
+    def _on_scan_notified(self, data: bytes = b""):
+        scanner = self._scanner
+        if scanner is None:
+            return
+
+        signal_args = (self.body, "modified", self._on_body_modified)
+        urwid.disconnect_signal(*signal_args)
+
+        w_focused = self.get_focused_item()
+        batch = [entry for batch in scanner.drain() for entry in batch]
+        for entry in batch:
+            self._scanned[entry.path] = entry
+        hydrate = []
+        if scanner.done:
+            self._scanner = None
+            self._apply_snapshot(self._scanned)
+            self._scanned = {}
+            if scanner.error is None:
+                self._scan_stamp = scanner.stamp
+                self._store_snapshot()
+            if not scanner.hydrate:
+                # NB: the metadata of the entries is only fetched once the
+                # scan is done (except for the visible ones, see
+                # `create_item`), so that both do not compete. The metadata of
+                # the known entries is fetched again too, to notice changes.
+                hydrate = [
+                    entry.path
+                    for entry in self.body.entries
+                    if not (self._scan_progressive and entry.hydrated)
+                ]
+        elif self._scan_progressive and batch:
+            self._set_entries(self.sort_entries(self.body.entries + batch))
+        self._focus_scan_target()
+
+        urwid.connect_signal(*signal_args)
+
+        if hydrate:
+            self.hydrate(hydrate, reuse=True)
+
+        urwid.emit_signal(self, "scan_progress", scanner.count, scanner.done)
+        if scanner.done:
+            if scanner.error is not None:
+                from bfm import w_root
+
+                w_root.error(str(scanner.error))
+            urwid.emit_signal(self, "refreshed")
+        elif self.get_focused_item() is not w_focused:
+            urwid.emit_signal(self, "focus_changed", self.get_focused_item())
 
     def _on_body_modified(self):
-        urwid.emit_signal(self, "focus_changed", self.get_focused_item())
+        if self.body:
+            self._focus_cache[self.path] = self.body.entry_at(
+                self.body.focus
+            ).path
+        if not self._background:
+            self._on_focus_settled()
+            return
+        # NB: when keys arrive in bursts (key repeat, pasted input, ...), the
+        # focus changes once per key. Listeners (metadata, preview) are only
+        # notified once the burst has been handled, of the last focus.
+        if self._focus_alarm is None:
+            from bfm import loop
 
-    def _on_focus_changed(self, w_item: ItemWidget):
-        self._focus_cache[self.path] = w_item.path
+            self._focus_alarm = loop.set_alarm_in(0, self._on_focus_settled)
+
+    def _on_focus_settled(self, *args):
+        self._focus_alarm = None
+        urwid.emit_signal(self, "focus_changed", self.get_focused_item())
 
     def _on_item_selected(self, w_item: ItemWidget):
-        if os.path.isdir(w_item.path):
+        entry = w_item.entry
+        # NB: the target of a symlink is not known until it is hydrated
+        if entry.is_dir or (
+            entry.is_link and not entry.hydrated and os.path.isdir(entry.path)
+        ):
             self.change_path(w_item.path)
         else:
             self.open_in_editor(w_item.path)
 
     def _on_path_changed(self, old_path: str, new_path: str):
+        signal_args = (self.body, "modified", self._on_body_modified)
+        urwid.disconnect_signal(*signal_args)
+        self.body.set_filter("")
+        self.body.set_entries([])
+        urwid.connect_signal(*signal_args)
+        self.marked.clear()
+        self._mark_anchor = None
+        self._scan_stamp = None
+        self.cancel_hydration()
+        if self.disk_usage is not None:
+            self.cancel_disk_usage()
+            self.disk_usage.clear()
         self.refresh(True)
+        self._watch(old_path, new_path)
 
-    # https://github.com/urwid/urwid/issues/305
-    def _keypress_max_left(self, *args, **kwargs):
-        super()._keypress_max_left(*args, **kwargs)
+    def _watch(self, old_path: str, new_path: str):
+        if not self._background:
+            return
+
+        from bfm import loop
+
+        cls = FolderWidget
+        if cls._watcher is None:
+            # NB: a single watcher for all instances, see `SharedWatcher`
+            cls._watcher = SharedWatcher(create_watcher())
+            fd = cls._watcher.fileno()
+            if fd is None:
+                loop.set_alarm_in(
+                    config.watch_poll_interval, cls._on_watch_poll
+                )
+            else:
+                loop.watch_file(fd, cls._watcher.dispatch)
+
+        if old_path is not None:
+            cls._watcher.unwatch(old_path, self._on_watch_changes)
+        self._watch_pending = set()
+        self._watch_rescan = False
+        try:
+            cls._watcher.watch(new_path, self._on_watch_changes)
+        except OSError:
+            # e.g. the inotify watches limit is reached. The listing can still
+            # be refreshed manually.
+            pass
+
+    @staticmethod
+    def _on_watch_poll(loop, *args):
+        loop.set_alarm_in(
+            config.watch_poll_interval, FolderWidget._on_watch_poll
+        )
+        FolderWidget._watcher.dispatch()
+
+    def _on_watch_changes(self, path: str, names):
+        if path != self.path:
+            return
+
+        if names is None:
+            self._watch_rescan = True
+        else:
+            names = names - self._job_names
+            if not names:
+                return
+            self._watch_pending.update(names)
+
+        # NB: events are coalesced, and only handled once things calm down a
+        # bit. This way, a burst of events only costs a few redraws.
+        if self._watch_alarm is None:
+            from bfm import loop
+
+            self._watch_alarm = loop.set_alarm_in(
+                config.watch_delay, self._on_watch_delay_elapsed
+            )
+
+    def _on_watch_delay_elapsed(self, loop, *args):
+        self._watch_alarm = None
+        if self._scanner is not None:
+            # Wait for the ongoing scan to complete
+            self._watch_alarm = loop.set_alarm_in(
+                config.watch_delay, self._on_watch_delay_elapsed
+            )
+            return
+
+        names, rescan = self._watch_pending, self._watch_rescan
+        self._watch_pending, self._watch_rescan = set(), False
+        if rescan or len(names) > config.watch_rescan_threshold:
+            self.refresh()
+            return
 
-    # https://github.com/urwid/urwid/issues/305
-    def _keypress_max_right(self, *args, **kwargs):
-        super()._keypress_max_right(*args, **kwargs)
+        # NB: vanished items are removed once their metadata is fetched
+        self.hydrate([os.path.join(self.path, name) for name in names])
@@ -0,0 +1,169 @@
+import collections
+import os
+import time
+from typing import Iterable
+
+from bfm import config, stats
+from bfm.fs import Entry, Hydrator
+from bfm.main_loop import Notifier
+
+
+class HydrationMixin:
+    # NB: Items are first listed with their name and type only (see
+    # `Entry.placeholder`). Their metadata is then fetched by a pool of worker
+    # threads, and each row is patched as soon as its metadata is known. This
+    # way, the main loop never waits for a slow item (e.g. on a hung network
+    # mount): when fetching its metadata times out, it is marked as stale.
+    # The pool is shared by all instances: the metadata of a folder shown by
+    # several of them (e.g. two panes) is only fetched once, and handed over
+    # to each of them.
+
+    # Shared by all instances, lazily created
+    _hydrator = None
+    _hydrate_alarm = None
+    # The instances which asked for metadata, until they leave their folder.
+    # NB: late results (see `Hydrator.expire`) are applied too.
+    _hydrating = set()
+    # The results drained since the pool was last idle. With `reuse`, they are
+    # handed over to the instances asking for them afterwards (e.g. a pane
+    # which joined the scan of another one, and is done later), instead of
+    # fetching them again.
+    _recent = {}
+
+    def __init__(self):
+        # Results not applied yet
+        self._hydrate_results = collections.deque()
+        self._hydrate_applied = False
+
+    def hydrate(
+        self, paths: Iterable[str], first: bool = False, reuse: bool = False
+    ):
+        # NB: `reuse` must not be set when the items are known to have changed
+        # (e.g. reported by the watcher).
+        if not self._background:
+            results = []
+            for path in paths:
+                try:
+                    results.append((path, Entry.from_path(path)))
+                except OSError as e:
+                    results.append((path, e))
+            self._apply_hydration(results)
+            return
+
+        cls = HydrationMixin
+        if cls._hydrator is None:
+            from bfm import loop
+
+            cls._hydrator = Hydrator(
+                Notifier(loop, cls._on_hydrator_notified),
+                config.metadata_workers,
+                config.metadata_timeout,
+                max_stuck=config.metadata_max_stuck,
+            )
+        if reuse:
+            cls._collect()
+        cls._hydrating.add(self)
+        if reuse and cls._recent:
+            missing = []
+            for path in paths:
+                result = cls._recent.get(path)
+                if result is None:
+                    missing.append(path)
+                else:
+                    self._hydrate_results.append((path, result))
+            paths = missing
+        cls._hydrator.submit(paths, first)
+        cls._schedule_hydration()
+
+    def cancel_hydration(self):
+        cls = HydrationMixin
+        cls._hydrating.discard(self)
+        self._hydrate_results.clear()
+        if cls._hydrator is not None:
+            # NB: the items of the folders shown by other instances are kept
+            paths = {w.path for w in cls._hydrating}
+            cls._hydrator.clear(lambda path: os.path.dirname(path) in paths)
+
+    @staticmethod
+    def _on_hydrator_notified(data: bytes = b""):
+        HydrationMixin._schedule_hydration()
+
+    @staticmethod
+    def _schedule_hydration(delay: float = None):
+        # NB: results are applied by batches, at most every
+        # `metadata_update_delay` seconds. Besides sparing redraws, this lets
+        # the main loop breathe: urwid only runs alarms and redraws the screen
+        # once no file descriptor is ready.
+        cls = HydrationMixin
+        if cls._hydrate_alarm is None:
+            from bfm import loop
+
+            if delay is None:
+                delay = config.metadata_update_delay
+            cls._hydrate_alarm = loop.set_alarm_in(delay, cls._on_hydrate_alarm)
+
+    @staticmethod
+    def _collect():
+        # Each result is handed over to the instances showing its folder
+        cls = HydrationMixin
+        hydrator = cls._hydrator
+        instances = collections.defaultdict(list)
+        for w in cls._hydrating:
+            instances[w.path].append(w)
+        results = list(hydrator.drain())
+        results.extend((path, TimeoutError(path)) for path in hydrator.expire())
+        cls._recent.update(results)
+        for path, result in results:
+            for w in instances.get(os.path.dirname(path), ()):
+                w._hydrate_results.append((path, result))
+
+    @staticmethod
+    def _on_hydrate_alarm(loop, *args):
+        cls = HydrationMixin
+        cls._hydrate_alarm = None
+        cls._collect()
+        # NB: results are applied for at most `metadata_time_slice` seconds,
+        # the rest is kept for the next alarm. This way, the screen is still
+        # redrawn while the metadata of a huge folder arrives.
+        # Instances take turns.
+        deadline = time.monotonic() + config.metadata_time_slice
+        pending = [w for w in cls._hydrating if w._hydrate_results]
+        while pending and time.monotonic() < deadline:
+            for w in pending:
+                results = w._hydrate_results
+                count = min(len(results), 1000)
+                w._apply_hydration([results.popleft() for _ in range(count)])
+                w._hydrate_applied = True
+            pending = [w for w in pending if w._hydrate_results]
+        if pending:
+            # NB: as long as the delay is positive, the screen is redrawn
+            # before the next alarm.
+            cls._schedule_hydration(0.001)
+        elif not cls._hydrator.idle:
+            cls._schedule_hydration()
+        else:
+            cls._recent.clear()
+            for w in cls._hydrating:
+                if w._hydrate_applied:
+                    # NB: the metadata is remembered along with the listing
+                    w._hydrate_applied = False
+                    w._store_snapshot()
+
+    @stats.timed("hydrate.apply")
+    def _apply_hydration(self, results: list):
+        # NB: results may be late, only the items of the current folder are
+        # updated.
+        upserts, removals = {}, set()
+        body = self.body
+        for path, result in results:
+            entry = body.get_entry(path)
+            if entry is None and os.path.dirname(path) != self.path:
+                continue
+            if isinstance(result, Entry):
+                upserts[path] = result
+            elif isinstance(result, FileNotFoundError):
+                removals.add(path)
+            elif entry is not None and not entry.stale:
+                upserts[path] = entry.as_stale()
+        if upserts or removals:
+            self.apply_changes(upserts, removals)
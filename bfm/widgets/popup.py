@@ -1,7 +1,16 @@
+import os
+import queue
+import threading
+import time
 from functools import partial
+from typing import List
 
 import urwid
 
+from bfm import config
+from bfm.index import FileIndex, FuzzySearch
+from bfm.main_loop import Notifier
+
 from .misc import MyEdit
 
 
@@ -11,6 +20,9 @@ class PopUpMixin:
     def close(self, success, *args):
         urwid.emit_signal(self, "close", success, *args)
 
+    def get_size(self, max_width: int, max_height: int):
+        return 42, 3
+
 
 class EditPopUp(PopUpMixin, urwid.WidgetWrap):
     def __init__(self, title: str, text: str):
@@ -22,3 +34,222 @@ class EditPopUp(PopUpMixin, urwid.WidgetWrap):
         w = urwid.AttrMap(w, "popup")
 
         urwid.WidgetWrap.__init__(self, w)
+
+
+class TextPopUp(PopUpMixin, urwid.WidgetWrap):
+    # Scrollable lines of text, closed with esc, q or enter
+    def __init__(self, title: str, lines: List[str]):
+        self._w_lines = urwid.SimpleFocusListWalker(
+            [SelectableText(line) for line in lines]
+        )
+        w = urwid.ListBox(self._w_lines)
+        w = urwid.LineBox(w, title=title, title_align="left")
+        w = urwid.AttrMap(w, "popup")
+        urwid.WidgetWrap.__init__(self, w)
+
+    def get_size(self, max_width: int, max_height: int):
+        return max_width * 3 // 4, max_height * 3 // 4
+
+    def keypress(self, size, key):
+        if key in ("esc", "q", "enter"):
+            self.close(True)
+        elif key in ("j", "k", "down", "up") and self._w_lines:
+            i = self._w_lines.get_focus()[1]
+            i += -1 if key in ("k", "up") else 1
+            self._w_lines.set_focus(max(0, min(i, len(self._w_lines) - 1)))
+
+
+class FinderPopUp(PopUpMixin, urwid.WidgetWrap):
+    # NB: The index of the tree is updated in a worker thread every time the
+    # finder is opened. Meanwhile, the index loaded previously (if any) is
+    # searched, or else the stored one, loaded first by the worker. The
+    # update is cancelled once the finder is closed.
+    _searches = {}  # root -> FuzzySearch
+    _updates = {}  # root -> cancellation event of the ongoing update
+
+    def __init__(self, root: str):
+        self.root = root
+        self._search = self._searches.get(root)
+        self._query = ""
+        self._matches = None
+        self._complete = False
+        self._searching = None
+        self._alarm_handle = None
+        self._closed = False
+        self._notifier = None
+
+        w_edit = urwid.Edit("> ")
+        urwid.connect_signal(w_edit, "postchange", self._on_query_changed)
+        self._w_results = urwid.SimpleFocusListWalker([])
+        self._w_pile = w = urwid.Pile(
+            [("pack", w_edit), urwid.ListBox(self._w_results)],
+            focus_item=0,
+        )
+        w = urwid.LineBox(w, title=root, title_align="left")
+        w = urwid.AttrMap(w, "popup")
+        urwid.WidgetWrap.__init__(self, w)
+
+        self._w_edit = w_edit
+        self._update_index()
+
+    def get_size(self, max_width: int, max_height: int):
+        return max_width * 3 // 4, max_height * 3 // 4
+
+    def keypress(self, size, key):
+        if key == "esc":
+            self._close(False)
+        elif key == "enter":
+            w_focus = self._w_results.get_focus()[0]
+            if w_focus is None:
+                self._close(False)
+            else:
+                path = w_focus.path.rstrip("/")
+                self._close(True, os.path.join(self.root, path))
+        elif key in ("up", "down") and self._w_results:
+            i = self._w_results.get_focus()[1] + (-1 if key == "up" else 1)
+            self._w_results.set_focus(max(0, min(i, len(self._w_results) - 1)))
+        else:
+            self._w_edit.keypress((size[0],), key)
+
+    def _close(self, success: bool, *args):
+        self._stop()
+        self._closed = True
+        cancelled = self._updates.pop(self.root, None)
+        if cancelled is not None:
+            cancelled.set()
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
+        self.close(success, *args)
+
+    def _update_index(self):
+        from bfm import loop
+
+        index = FileIndex(config.index_path)
+        root = self.root
+        # NB: a single update per root
+        previous = self._updates.get(root)
+        if previous is not None:
+            previous.set()
+        self._updates[root] = cancelled = threading.Event()
+
+        def notify(data: bytes):
+            if self._closed:
+                return
+            while True:
+                try:
+                    kind, value = results.get_nowait()
+                except queue.Empty:
+                    return
+                if kind == "search":
+                    self._searches.clear()
+                    self._searches[root] = self._search = value
+                    self._matches = None
+                    self._start_search()
+                    continue
+                self._notifier.close()
+                self._notifier = None
+                if self._updates.get(root) is cancelled:
+                    del self._updates[root]
+                if kind == "error":
+                    message = "Cannot update the index: {}".format(value)
+                    self._w_pile.contents.append(
+                        (urwid.Text(("error", message)), ("pack", None))
+                    )
+                return
+
+        def run():
+            try:
+                if self._search is None:
+                    paths = index.load(root)
+                    if paths:
+                        results.put(("search", FuzzySearch(paths)))
+                        notifier()
+                paths = index.update(root, cancelled.is_set)
+                if paths is not None:
+                    results.put(("search", FuzzySearch(paths)))
+            except Exception as e:
+                # e.g. the cache folder is not writable
+                results.put(("error", e))
+            results.put(("done", None))
+            notifier()
+
+        results = queue.SimpleQueue()
+        self._notifier = notifier = Notifier(loop, notify)
+        threading.Thread(target=run, daemon=True).start()
+
+    def _on_query_changed(self, w_edit: urwid.Edit, old_text: str):
+        self._start_search()
+
+    def _start_search(self):
+        self._stop()
+        query = self._w_edit.get_edit_text()
+        if self._search is None or not query:
+            self._show([])
+            return
+
+        # Refine the previous matches when the query was only extended
+        candidates = None
+        if (
+            self._matches is not None
+            and self._complete
+            and query.startswith(self._query)
+        ):
+            candidates = self._matches
+        self._query = query
+        self._matches = []
+        self._complete = False
+        self._searching = self._search.search(
+            query, config.finder_max_matches, candidates
+        )
+        self._step()
+
+    def _step(self, *args):
+        # Search for at most `finder_time_slice` seconds, then give control
+        # back to the main loop, so that keystrokes are handled promptly.
+        from bfm import loop
+
+        self._alarm_handle = None
+        deadline = time.monotonic() + config.finder_time_slice
+        for matches in self._searching:
+            self._matches.extend(matches)
+            if time.monotonic() > deadline:
+                self._alarm_handle = loop.set_alarm_in(0, self._step)
+                break
+        else:
+            self._searching = None
+            self._complete = len(self._matches) < config.finder_max_matches
+        self._show(
+            self._search.rank(
+                self._query, self._matches, config.finder_max_results
+            )
+        )
+
+    def _stop(self):
+        if self._alarm_handle is not None:
+            from bfm import loop
+
+            loop.remove_alarm(self._alarm_handle)
+            self._alarm_handle = None
+        self._searching = None
+
+    def _show(self, indices: List[int]):
+        self._w_results[:] = [
+            SelectableText(self._search.paths[i]) for i in indices
+        ]
+        if self._w_results:
+            self._w_results.set_focus(0)
+
+
+class SelectableText(urwid.WidgetWrap):
+    def __init__(self, path: str):
+        self.path = path
+        w = urwid.Text(path, wrap="clip")
+        w = urwid.AttrMap(w, None, focus_map="focus")
+        urwid.WidgetWrap.__init__(self, w)
+
+    def selectable(self):
+        return True
+
+    def keypress(self, size, key):
+        return key
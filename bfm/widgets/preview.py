@@ -0,0 +1,267 @@
+import itertools
+import os
+import signal
+import subprocess
+import time
+from typing import Callable, Iterable, Optional
+
+from bfm import config, stats
+from bfm.cache import LRUCache
+from bfm.fs import Entry, scanpath
+from bfm.previewers import preview_file, preview_folder
+from bfm.vendor.ansi_widget import ANSIWidget
+
+from .fs import FolderWidget
+from .layout import LastRenderedSizeMixin
+
+
+class PreviewJob:
+    def __init__(
+        self,
+        key: tuple,
+        command: str,
+        max_lines: int,
+        on_output: Callable[["PreviewJob", bytes], None],
+        on_done: Callable[["PreviewJob"], None],
+    ):
+        from bfm import loop
+
+        self.key = key
+        self.chunks = []
+        self._start = time.perf_counter()
+        self._max_lines = max_lines
+        self._lines = 0
+        self._on_output_cb = on_output
+        self._on_done_cb = on_done
+        self._proc = subprocess.Popen(
+            command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+            preexec_fn=os.setsid,  # see [0]
+        )
+        self._watch_handle = loop.watch_file(
+            self._proc.stdout.fileno(), self._on_output
+        )
+
+    @property
+    def output(self) -> bytes:
+        output = b"".join(self.chunks)
+        if self._lines >= self._max_lines:
+            lines = output.split(b"\n", self._max_lines)[: self._max_lines]
+            output = b"\n".join(lines)
+        return output
+
+    def stop(self):
+        if self._proc is None:
+            return
+
+        from bfm import loop
+
+        loop.remove_watch_file(self._watch_handle)
+        self._proc.stdout.close()
+        if self._proc.poll() is None:
+            # [0]: Since `shell=True` is used in `subprocess.Popen(...)`, a
+            # simple call to `self._proc.kill()` cannot be used. The process'
+            # children would not be killed and could still write to stdout.
+            # https://stackoverflow.com/questions/4789837/how-to-terminate-a-python-subprocess-launched-with-shell-true
+            try:
+                os.killpg(os.getpgid(self._proc.pid), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self._proc = None
+
+    def _on_output(self):
+        data = os.read(self._proc.stdout.fileno(), 64 * 1024)
+        if data:
+            self.chunks.append(data)
+            self._on_output_cb(self, data)
+            # NB: there is no need to read more than what can be displayed.
+            # This also protects against commands dumping huge outputs.
+            self._lines += data.count(b"\n")
+            if self._lines < self._max_lines:
+                return
+        # The command is done (or at least, closed its output)
+        if stats.enabled:
+            stats.record("preview.command", time.perf_counter() - self._start)
+        self.stop()
+        self._on_done_cb(self)
+
+
+class PreviewWidget(LastRenderedSizeMixin, ANSIWidget):
+    # NB: Preview commands are not started right away: they are delayed until
+    # the focus settles down (see `config.preview_delay`), so that scrolling
+    # through a listing does not spawn a process per item. Once the focused
+    # item is previewed, the items around it are previewed in the background,
+    # to fill the cache. At most `config.preview_max_processes` commands run at
+    # the same time.
+
+    # Output of the previous preview commands, shared by all instances
+    _cache = LRUCache(config.preview_cache_size, weigh=len)
+
+    def __init__(self):
+        super().__init__()
+        self._jobs = {}  # cache key -> PreviewJob
+        # (cache key, command) of the previewed item, and of the items to
+        # prefetch
+        self._current = None
+        self._prefetch = []
+        self._alarm_handle = None
+        # When False, the preview commands are always used
+        self.native = config.native_previews
+
+    def preview(self, entry: Entry, neighbours: Iterable[Entry] = ()):
+        self._cancel_alarm()
+        self.clear()
+        self.max_lines = self._get_max_lines()
+
+        output = self.native_preview(entry) if entry and self.native else None
+        if output is not None:
+            self.append(output)
+            # NB: native previews are cheap enough to not need prefetching
+            entry, neighbours = None, ()
+
+        self._current = self.get_request(entry) if entry else None
+        self._prefetch = list(map(self.get_request, neighbours))
+
+        # Stop the commands that became useless
+        wanted = {key for key, _ in self._prefetch}
+        if self._current:
+            wanted.add(self._current[0])
+        for key in list(self._jobs):
+            if key not in wanted:
+                self._jobs.pop(key).stop()
+
+        if self._current is None:
+            return
+
+        key, _ = self._current
+        output = self._cache.get(key)
+        if output is not None:
+            self.append(output)
+            self._schedule(config.preview_prefetch_delay, self._start_prefetch)
+        elif key in self._jobs:
+            # Already being prefetched
+            self.append(self._jobs[key].output)
+        else:
+            self._schedule(config.preview_delay, self._start_current)
+
+    @stats.timed("preview.native")
+    def native_preview(self, entry: Entry) -> Optional[bytes]:
+        # Returns None if the item cannot be previewed natively
+        max_lines = self._get_max_lines()
+        if not entry.is_dir:
+            return preview_file(
+                entry.path, max_lines, config.native_preview_max_bytes
+            )
+
+        entries = FolderWidget.get_snapshot(entry.path)
+        if entries is None:
+            # NB: placeholders, i.e. no syscall per item: the metadata of the
+            # items is not previewed anyway, and the main loop must not wait
+            # for a slow filesystem.
+            max_entries = config.native_preview_max_entries
+            it = scanpath(entry.path, hydrate=False)
+            try:
+                entries = list(itertools.islice(it, max_entries + 1))
+            except OSError:
+                return None
+            finally:
+                it.close()
+            if len(entries) > max_entries:
+                # Too big to be scanned synchronously
+                return None
+            entries.sort(key=FolderWidget.sorting_key)
+        return preview_folder(entries, max_lines)
+
+    def get_request(self, entry: Entry):
+        if entry.is_dir:
+            command = config.folder_preview
+        else:
+            command = config.file_preview
+        command = command.format(path=entry.path)
+        return self.get_cache_key(entry, command), command
+
+    def get_cache_key(self, entry: Entry, command: str):
+        # NB: the output is considered unchanged as long as the previewed item
+        # has the same mtime and size (and target, for symlinks). They are
+        # known from the listing, so that the main loop never hits the
+        # filesystem here.
+        if entry.stat is None:
+            mtime = size = None
+        else:
+            mtime, size = entry.stat.st_mtime_ns, entry.stat.st_size
+        return (
+            entry.path,
+            mtime,
+            size,
+            entry.link_target,
+            self._get_size(),
+            command,
+        )
+
+    def _get_size(self):
+        try:
+            return self._LastRenderedSizeMixin__size
+        except AttributeError:
+            # Not rendered yet
+            return None
+
+    def _get_max_lines(self) -> int:
+        size = self._get_size()
+        return size[1] if size else config.preview_max_lines
+
+    def _cancel_alarm(self):
+        if self._alarm_handle is not None:
+            from bfm import loop
+
+            loop.remove_alarm(self._alarm_handle)
+            self._alarm_handle = None
+
+    def _schedule(self, delay: float, callback: Callable[[], None]):
+        from bfm import loop
+
+        def on_alarm(*args):
+            self._alarm_handle = None
+            callback()
+
+        self._cancel_alarm()
+        self._alarm_handle = loop.set_alarm_in(delay, on_alarm)
+
+    def _start(self, key: tuple, command: str):
+        self._jobs[key] = PreviewJob(
+            key,
+            command,
+            self._get_max_lines(),
+            self._on_job_output,
+            self._on_job_done,
+        )
+
+    def _start_current(self):
+        key, command = self._current
+        # The previewed item always has priority over prefetching
+        for other_key in list(self._jobs):
+            if len(self._jobs) < config.preview_max_processes:
+                break
+            if other_key != key:
+                self._jobs.pop(other_key).stop()
+        self._start(key, command)
+
+    def _start_prefetch(self):
+        while self._prefetch and len(self._jobs) < config.preview_max_processes:
+            key, command = self._prefetch.pop(0)
+            if key not in self._cache and key not in self._jobs:
+                self._start(key, command)
+
+    def _on_job_output(self, job: PreviewJob, data: bytes):
+        if self._current and job.key == self._current[0]:
+            self.append(data)
+
+    def _on_job_done(self, job: PreviewJob):
+        del self._jobs[job.key]
+        self._cache.put(job.key, job.output)
+        if self._current and job.key == self._current[0]:
+            self._schedule(config.preview_prefetch_delay, self._start_prefetch)
+        elif self._alarm_handle is None:
+            self._start_prefetch()
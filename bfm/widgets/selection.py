@@ -0,0 +1,215 @@
+import os
+from typing import List
+
+import urwid
+
+from bfm.fs import Entry
+from bfm.jobs import BatchJob, TransferJob
+from bfm.main_loop import Notifier
+
+from .popup import EditPopUp
+
+
+class SelectionMixin:
+    # NB: Items can be marked, so that operations apply to all of them at once
+    # (or to the focused item when nothing is marked). Operations run as jobs
+    # in worker threads, several of them possibly at the same time, and the
+    # listing is updated with a single `apply_changes` once a job is over.
+
+    # Yanked paths, and whether they are to be moved when pasted. Shared by
+    # all instances.
+    clipboard = ([], False)
+
+    def __init__(self):
+        self.marked = set()
+        self._mark_anchor = None
+        self._jobs = []
+        self._job_notifier = None
+        # Names the watcher should not report while jobs are running, as the
+        # jobs will apply the corresponding changes themselves.
+        self._job_names = set()
+
+    def toggle_mark(self, count: int = 1):
+        # Toggle the focused item, and the `count - 1` next ones
+        for entry in self._get_next_entries(count):
+            self._set_marked([entry.path], entry.path not in self.marked)
+            self._mark_anchor = entry.path
+        self.body.set_focus(self.body.focus + count)
+
+    def mark_range(self):
+        # Mark the visible items between the last toggled one and the focused
+        # one.
+        if not self.body:
+            return
+        try:
+            anchor = self.body.index(self._mark_anchor)
+        except KeyError:
+            anchor = self.body.focus
+        start, end = sorted([anchor, self.body.focus])
+        paths = [self.body.entry_at(i).path for i in range(start, end + 1)]
+        self._set_marked(paths, True)
+
+    def invert_marks(self):
+        paths = [self.body.entry_at(i).path for i in range(len(self.body))]
+        marked = [path for path in paths if path in self.marked]
+        self._set_marked(paths, True)
+        self._set_marked(marked, False)
+
+    def clear_marks(self):
+        self._set_marked(list(self.marked), False)
+
+    def get_selection(self, count: int = None) -> List[Entry]:
+        # The marked items, or the focused one if there are none. With a
+        # count, the focused item and the `count - 1` next ones instead.
+        if count is not None:
+            return self._get_next_entries(count)
+        entries = [self.body.get_entry(path) for path in self.marked]
+        entries = [entry for entry in entries if entry is not None]
+        if not entries:
+            entries = self._get_next_entries(1)
+        return self.sort_entries(entries)
+
+    def trash_selection(self, count: int = None):
+        from send2trash import send2trash
+
+        paths = [entry.path for entry in self.get_selection(count)]
+        if paths:
+            self.run_job(BatchJob("Trash", send2trash, paths))
+
+    def yank_selection(self, cut: bool = False, count: int = None):
+        paths = [entry.path for entry in self.get_selection(count)]
+        SelectionMixin.clipboard = (paths, cut)
+        self.clear_marks()
+
+    def paste(self):
+        # Copy (or move) the yanked paths to the current folder. Existing
+        # items are not overwritten, the copies are renamed instead.
+        paths, cut = SelectionMixin.clipboard
+        if not paths:
+            return
+        destinations = {}
+        for path in paths:
+            dst = os.path.join(self.path, _basename(path))
+            if dst == path and cut:
+                continue
+            destinations[path] = _free_path(dst, destinations.values())
+        if cut:
+            SelectionMixin.clipboard = ([], False)
+        if destinations:
+            self.run_job(TransferJob(destinations, move=cut))
+
+    def move_selection(self, count: int = None):
+        paths = [entry.path for entry in self.get_selection(count)]
+        if not paths:
+            return
+
+        def on_close(success: bool, text: str):
+            if not success:
+                return
+            if len(paths) == 1:
+                destinations = {paths[0]: text}
+            else:
+                # Move every item into the given folder
+                destinations = {
+                    path: os.path.join(text, _basename(path)) for path in paths
+                }
+            self.run_job(TransferJob(destinations, move=True))
+
+        from bfm import w_root
+
+        if len(paths) == 1:
+            w_pop_up = EditPopUp(title="Move to", text=paths[0])
+        else:
+            title = "Move {} items to".format(len(paths))
+            w_pop_up = EditPopUp(title=title, text=self.path)
+        urwid.connect_signal(w_pop_up, "close", on_close)
+        w_root.open_pop_up(w_pop_up)
+
+    def run_job(self, job: BatchJob):
+        self._jobs.append(job)
+        self._update_job_names()
+        if self._background:
+            from bfm import loop
+
+            if self._job_notifier is None:
+                self._job_notifier = Notifier(loop, self._on_job_notified)
+            job.notify = self._job_notifier
+            job.start()
+        else:
+            job.run()
+        self._on_job_notified()
+
+    def cancel_jobs(self):
+        for job in self._jobs:
+            job.cancel()
+
+    def _update_job_names(self):
+        names = set()
+        for job in self._jobs:
+            if job.removes_sources:
+                names.update(map(_basename, job.paths))
+            for dst in getattr(job, "destinations", {}).values():
+                names.add(_basename(dst))
+        self._job_names = names
+
+    def _get_next_entries(self, count: int) -> List[Entry]:
+        focus = self.body.focus
+        end = min(focus + count, len(self.body))
+        return [self.body.entry_at(i) for i in range(focus, end)]
+
+    def _set_marked(self, paths: List[str], marked: bool):
+        for path in paths:
+            if marked:
+                self.marked.add(path)
+            else:
+                self.marked.discard(path)
+            w_item = self.body.get_widget(path)
+            if w_item is not None and w_item.marked != marked:
+                w_item.marked = marked
+                w_item.update_widget()
+        self._invalidate()
+
+    def _on_job_notified(self, data: bytes = b""):
+        for job in [job for job in self._jobs if job.done]:
+            self._jobs.remove(job)
+            self._update_job_names()
+            self._on_job_done(job)
+        progress = " | ".join(job.progress for job in self._jobs)
+        urwid.emit_signal(self, "job_progress", progress)
+
+    def _on_job_done(self, job: BatchJob):
+        # NB: the listing may have changed in the meantime, only the items of
+        # the current folder are updated.
+        upserts, removals = [], set()
+        for path, result in job.results:
+            if job.removes_sources and os.path.dirname(path) == self.path:
+                removals.add(path)
+            if isinstance(result, str) and os.path.dirname(result) == self.path:
+                upserts.append(result)
+        removals.difference_update(upserts)
+        self._set_marked([path for path, _ in job.results], False)
+        self.apply_changes({}, removals)
+        self.hydrate(upserts)
+
+        if job.errors:
+            from bfm import w_root
+
+            path, error = job.errors[0]
+            w_root.error(
+                "{}: {} error(s), e.g. '{}': {}".format(
+                    job.title, len(job.errors), path, error
+                )
+            )
+
+
+def _basename(path: str) -> str:
+    return os.path.basename(path.rstrip("/"))
+
+
+def _free_path(path: str, taken) -> str:
+    # `path`, or `path_1`, `path_2`, ... if it already exists
+    candidate, i = path, 0
+    while os.path.lexists(candidate) or candidate in taken:
+        i += 1
+        candidate = "{}_{}".format(path, i)
+    return candidate
@@ -0,0 +1,65 @@
+from typing import Iterable, List
+
+import urwid
+
+from bfm import config, stats
+from bfm.fs import Entry
+from bfm.sorting import orders, sort_entries
+
+
+class SortMixin:
+    # NB: Switching orders sorts the entries already listed, using the
+    # metadata fetched with them: no syscall, and the item widgets are kept.
+
+    def __init__(self):
+        self.sort_order = config.sort_order
+        self.sort_reverse = config.sort_reverse
+        self._resort_alarm = None
+
+    @property
+    def sort_key(self):
+        if self.sort_by_disk_usage:
+            return self.disk_usage_key
+        return orders[self.sort_order]
+
+    @stats.timed("sort")
+    def sort_entries(self, entries: Iterable[Entry]) -> List[Entry]:
+        if self.sort_by_disk_usage:
+            # NB: folders and files are mixed, see `disk_usage_key`
+            return sorted(
+                entries, key=self.disk_usage_key, reverse=self.sort_reverse
+            )
+        return sort_entries(entries, self.sort_key, self.sort_reverse)
+
+    def set_sort_order(self, order: str):
+        self.sort_order = order
+        self.sort_by_disk_usage = False
+        self.resort()
+
+    def toggle_sort_reverse(self):
+        self.sort_reverse = not self.sort_reverse
+        self.resort()
+
+    @stats.timed("resort")
+    def resort(self):
+        signal_args = (self.body, "modified", self._on_body_modified)
+        urwid.disconnect_signal(*signal_args)
+        self._set_entries(self.sort_entries(self.body.entries))
+        urwid.connect_signal(*signal_args)
+
+    def _schedule_resort(self):
+        # NB: when the keys of many items change in a row (e.g. while their
+        # metadata arrives), the listing is only sorted again once in a while.
+        if not self._background:
+            self.resort()
+            return
+        if self._resort_alarm is not None:
+            return
+
+        from bfm import loop
+
+        def on_alarm(*args):
+            self._resort_alarm = None
+            self.resort()
+
+        self._resort_alarm = loop.set_alarm_in(config.resort_delay, on_alarm)
@@ -0,0 +1,167 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, List
+
+import urwid
+
+from bfm.fs import Entry
+
+
+class EntryListWalker(urwid.ListWalker):
+    # NB: Contrary to `urwid.SimpleListWalker`, this walker does not hold one
+    # widget per item. It is backed by a sorted list of `Entry`, and widgets
+    # are only created when the listbox asks for them, i.e. for visible rows.
+    # The most recently used ones are kept in a small LRU cache.
+    def __init__(
+        self,
+        widget_factory: Callable[[Entry], urwid.Widget],
+        cache_size: int = 256,
+    ):
+        self._widget_factory = widget_factory
+        self._cache_size = cache_size
+        self._widgets = OrderedDict()
+        self._entries = []
+        # Maps each entry path to its position in `_entries`
+        self._index = {}
+        # NB: When a filter is set, only the entries whose lowercase name
+        # contains `_filter` are visible: `_view` holds their (sorted)
+        # positions in `_entries`.
+        # Positions given to and by the listbox are visible positions.
+        self._filter = ""
+        self._names = None
+        self._view = None
+        self.focus = 0
+
+    def __len__(self) -> int:
+        if self._view is not None:
+            return len(self._view)
+        return len(self._entries)
+
+    def __getitem__(self, position: int) -> urwid.Widget:
+        entry = self.entry_at(position)
+        try:
+            w = self._widgets[entry.path]
+        except KeyError:
+            w = self._widgets[entry.path] = self._widget_factory(entry)
+            if len(self._widgets) > self._cache_size:
+                self._widgets.popitem(last=False)
+        else:
+            self._widgets.move_to_end(entry.path)
+        return w
+
+    @property
+    def entries(self) -> List[Entry]:
+        # XXX: all the entries, including the filtered out ones
+        return self._entries
+
+    def entry_at(self, position: int) -> Entry:
+        if self._view is not None:
+            position = self._view[position]
+        return self._entries[position]
+
+    def set_entries(self, entries: List[Entry]):
+        # XXX: `entries` must already be sorted
+        self._entries = entries
+        self._index = {entry.path: i for i, entry in enumerate(entries)}
+        self._widgets = OrderedDict(
+            (path, w)
+            for path, w in self._widgets.items()
+            if path in self._index
+        )
+        self._names = None
+        if self._filter:
+            self._apply_filter(self._filter, refine=False)
+        self.focus = max(0, min(self.focus, len(self) - 1))
+        self._modified()
+
+    @property
+    def filter(self) -> str:
+        return self._filter
+
+    def set_filter(self, text: str):
+        # The focused entry stays focused if it is still visible
+        focused = self.entry_at(self.focus) if len(self) else None
+        text = text.lower()
+        # NB: When the new filter extends the previous one, only the entries
+        # that matched it need to be checked.
+        refine = self._view is not None and text.startswith(self._filter)
+        self._filter = text
+        if text:
+            self._apply_filter(text, refine)
+        else:
+            self._view = None
+        try:
+            self.focus = self.index(focused.path) if focused else 0
+        except KeyError:
+            self.focus = 0
+        self._modified()
+
+    def _apply_filter(self, text: str, refine: bool):
+        if self._names is None:
+            self._names = [entry.lower_name for entry in self._entries]
+        names = self._names
+        candidates = self._view if refine else range(len(names))
+        self._view = [i for i in candidates if text in names[i]]
+
+    def update_entry(self, entry: Entry):
+        # Replace an entry in place. Its position is assumed not to change.
+        self._entries[self._index[entry.path]] = entry
+        w = self._widgets.get(entry.path)
+        if w is not None:
+            w.update_widget(entry)
+
+    def get_widget(self, path: str) -> urwid.Widget:
+        # Only returns already created widgets
+        return self._widgets.get(path)
+
+    def clear_widgets(self):
+        self._widgets.clear()
+
+    def index(self, path: str) -> int:
+        # Raises KeyError if the entry is filtered out
+        i = self._index[path]
+        if self._view is None:
+            return i
+        position = bisect_left(self._view, i)
+        if position == len(self._view) or self._view[position] != i:
+            raise KeyError(path)
+        return position
+
+    def get_entry(self, path: str) -> Entry:
+        i = self._index.get(path)
+        return None if i is None else self._entries[i]
+
+    def get_focus(self):
+        if not len(self):
+            return None, None
+        return self[self.focus], self.focus
+
+    def set_focus(self, position: int):
+        if len(self):
+            self.focus = max(0, min(position, len(self) - 1))
+        self._modified()
+
+    def get_next(self, position: int):
+        if position + 1 >= len(self):
+            return None, None
+        return self[position + 1], position + 1
+
+    def get_prev(self, position: int):
+        if position <= 0:
+            return None, None
+        return self[position - 1], position - 1
+
+    def next_position(self, position: int) -> int:
+        if position + 1 >= len(self):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse: bool = False):
+        if reverse:
+            return range(len(self) - 1, -1, -1)
+        return range(len(self))
@@ -30,9 +30,8 @@ setuptools.setup(
     ],
     package_dir={"bfm": "bfm"},
     packages=setuptools.find_packages(),
-    python_requires=">=3.5",
+    python_requires=">=3.7",
     install_requires=[
-        "humanize",
         "send2trash",
         "urwid",
     ],